@@ -0,0 +1,84 @@
+"""
+BME280.update_async, BME280Group.update_async and
+WeatherStation.run_async with a fake I2C bus, to run them without a
+board (CPython or the MicroPython unix port) from the root of the
+repository:
+
+    python -m implementations.async_fake_bus
+
+The sensors are the ones of implementations.fake_bme280_bus. The
+weather station also needs framebuf (included in MicroPython), its
+screen is faked too.
+"""
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+from udevices.bme280 import BME280, BME280Group
+from implementations.fake_bme280_bus import FakeI2C
+
+
+async def _count_ticks(counter):
+    # Runs while the sensors are measured, to show that they yield
+    while True:
+        counter[0] += 1
+        await asyncio.sleep(0)
+
+
+async def measure():
+    bus = FakeI2C(addresses=(0x76, 0x77))
+    sensor = BME280(i2c=bus)
+    group = BME280Group([sensor, BME280(address=0x77, i2c=bus)])
+
+    counter = [0]
+    ticker = asyncio.create_task(_count_ticks(counter))
+    reading = await sensor.update_async()
+    print("BME280.update_async: {:.2f} C {:.2f} hPa".format(
+        reading.temperature, reading.pressure))
+    readings = await group.update_async()
+    for address, reading in zip((0x76, 0x77), readings):
+        print("BME280Group.update_async 0x{:x}: {:.2f} C {:.2f} hPa".format(
+            address, reading.temperature, reading.pressure))
+    ticker.cancel()
+    print("Other task ran {} times during the measures".format(counter[0]))
+
+
+async def run_station():
+    try:
+        from udevices.ssd1306 import SSD1306
+    except ImportError:
+        print("No framebuf module, WeatherStation.run_async skipped")
+        return
+    from udevices.weather_station import WeatherStation
+
+    class FakeOLED(SSD1306):
+        """
+        Screen that only counts the bytes sent to it
+        """
+
+        def __init__(self):
+            self.sent = 0
+            super(FakeOLED, self).__init__(128, 64, False)
+
+        def write_cmd(self, cmd):
+            pass
+
+        def write_data(self, buf):
+            self.sent += len(buf)
+
+    oled = FakeOLED()
+    station = WeatherStation(None, None, update_time=0.01, pin_mode=None,
+                             oled=oled, bme280=BME280(i2c=FakeI2C()))
+    task = asyncio.create_task(station.run_async())
+    await asyncio.sleep(0.1)
+    task.cancel()
+    print("WeatherStation.run_async: {} bytes sent to the screen, "
+          "{:.2f} C".format(oled.sent, station.bme280.temperature))
+
+
+async def main():
+    await measure()
+    await run_station()
+
+
+asyncio.run(main())
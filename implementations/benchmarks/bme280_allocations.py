@@ -0,0 +1,47 @@
+"""
+Heap allocated per BME280 reading with the float and the integer
+compensation. It needs gc.mem_alloc, so it only runs on MicroPython
+(the allocations of CPython say nothing about the ones of the board).
+No sensor is needed, the bus is implementations.fake_bme280_bus. Run
+from the root of the repository:
+
+    python -m implementations.benchmarks.bme280_allocations
+"""
+import gc
+from udevices.bme280 import BME280, Compensation
+from implementations.fake_bme280_bus import FakeI2C
+
+READINGS = 200
+
+
+def _allocated(function):
+    gc.collect()
+    gc.disable()
+    before = gc.mem_alloc()
+    function()
+    allocated = gc.mem_alloc() - before
+    gc.enable()
+    return allocated
+
+
+def bytes_per_reading(compensation):
+    """
+    Bytes of heap allocated by each reading (read and compensation)
+    """
+    sensor = BME280(i2c=FakeI2C(), compensation=compensation)
+
+    def read():
+        for _ in range(READINGS):
+            sensor._read_data()
+
+    read()
+    return _allocated(read) / READINGS
+
+
+if hasattr(gc, "mem_alloc"):
+    for name, compensation in (("float", Compensation.FLOAT),
+                               ("integer", Compensation.INTEGER)):
+        print("{:8s}: {:7.1f} bytes/reading".format(
+            name, bytes_per_reading(compensation)))
+else:
+    print("gc.mem_alloc is not available, run it with MicroPython")
@@ -2,10 +2,12 @@ from umqtt.simple import MQTTClient
 import machine
 import time
 import json
-from bme280 import BME280
+from bme280 import BME280, RTCCalibrationCache
 
 def meassure():
-    bme = BME280(i2c=machine.I2C(0))
+    # The calibration survives deep sleep in the RTC memory
+    bme = BME280(i2c=machine.I2C(0), cache=RTCCalibrationCache(),
+                 trust_cache=True)
     bme.update()
     info = {"temperature": bme.temperature, "pressure": bme.pressure}
     return info
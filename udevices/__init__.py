@@ -1,6 +1,7 @@
-from .bme280 import BME280
-from .shift_register import ShiftRegister
-from .storage import Deque, MultipleHistorial
+from .bme280 import BME280, BME280Group
+from .shift_register import ShiftRegister, SPIShiftRegister
+from .storage import Deque, MultipleHistorial, PersistentHistorial
+from .multiplex import Multiplexer
 
 def OLED():
     """
@@ -12,4 +13,5 @@ def OLED():
     return ssd1306.SSD1306_I2C(128, 64, i2c)
     
 
-__all__ = ("BME280", "ShiftRegister", "Deque", "MultipleHistorial")
+__all__ = ("BME280", "BME280Group", "ShiftRegister", "SPIShiftRegister", "Deque",
+           "MultipleHistorial", "PersistentHistorial", "Multiplexer")
@@ -1,6 +1,15 @@
 import time
-from machine import I2C, Pin
+import math
+from array import array
 import struct
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+try:
+    from .registers import RegisterShadow
+except ImportError:
+    from registers import RegisterShadow
 
 class BME280(object):
 
@@ -9,12 +18,35 @@ class BME280(object):
                  "CRTL_MEAS": 0xF4,
                  "CONFIG": 0xF5,
                  "TRIMMING_START": 0x88,
+                 "STATUS": 0xF3,
                  "DATA": 0xF7}
     RESET_WORD = 0xB6
     TRIMMING_LENGTH = 24
+    # T1 and P1 unsigned, the rest signed (datasheet, table 16)
+    TRIMMING_FORMAT = "<H2hH8h"
+    DATA_LENGTH = 8
+    MEASURING_BIT = 0x08
+    POLL_INTERVAL = 0.001
+    # Oversampling code -> number of samples
+    OVERSAMPLING_FACTORS = (0, 1, 2, 4, 8, 16)
+    # Pressure RMS noise (Pa) per oversampling code with the filter off
+    PRESSURE_NOISE = (None, 3.3, 2.6, 2.1, 1.6, 1.3)
+    # Filter code -> coefficient and samples to reach 75% of a step
+    FILTER_COEFFICIENTS = (1, 2, 4, 8, 16)
+    FILTER_RESPONSE = (1, 2, 5, 11, 22)
+    # Standby code -> time (ms)
+    STANDBY_TIMES = (0.5, 62.5, 125, 250, 500, 1000, 10, 20)
+    # Supply currents (uA)
+    TEMPERATURE_CURRENT = 350
+    PRESSURE_CURRENT = 714
+    STANDBY_CURRENT = 0.2
+    # Factors of 3125 * 2**11, the division of the integer pressure is
+    # done in these steps so the remainder stays a small int
+    PRESSURE_DIVISION_STEPS = (5, 5, 5, 5, 5, 16, 16, 8)
 
     def __init__(self, address=None, i2c=None,
-                 sda=None, scl=None):
+                 sda=None, scl=None, cache=None, trust_cache=False,
+                 compensation=None, bus_id=0):
         """
         Creattes a bme280 temperature, pressure and (optionally)
         humidity using I2C.
@@ -33,12 +65,41 @@ class BME280(object):
         bus : smbus.SMBus or None
             If not None an open bus were the object can be found. If
             None a new bus will be opened. Default None
+        cache : CalibrationCache or None (optional)
+            If not None the trimming is loaded from this cache when it
+            has an entry for the bus, address and chip id (only the
+            chip id is read from the sensor), and stored in it when it
+            has not. All the BME280 have the same chip id, so a sensor
+            replaced by another one in the same bus and address is not
+            detected: clear the cache after replacing it. Default None
+        trust_cache : bool (optional)
+            If True and the cache has an entry for the sensor the chip
+            id is not checked either, so the sensor is not accessed at
+            all until the first measurement. Default False.
+        compensation : int or None (optional)
+            Compensation algorithm, see the Compensation object. If
+            None Compensation.FLOAT is used. With Compensation.INTEGER
+            the samples do not allocate memory (all the values are
+            small ints for the trimming of real sensors), so the same
+            Reading is updated in place by each sample. Default None.
+        bus_id : int (optional)
+            Number of the bus, to tell apart in the cache the sensors
+            with the same address in different buses. Default 0
 
         """
 
         self._chip_id = None
         self._chip_version = None
         self._trimming = {}
+        self._trimming_flat = array("i")
+        self._pressure_int_trims = ()
+        self._buffer = bytearray(self.DATA_LENGTH)
+        self._reading = None
+        self._sea_level_pressure = 1013.25
+        self._elevation = 0
+        if compensation is None:
+            compensation = Compensation.FLOAT
+        self._compensation = compensation
         self._data = {"temperature": None,
                       "pressure": None,
                       "humidity": None}
@@ -56,60 +117,116 @@ class BME280(object):
         if i2c is None:
             if sda is None or scl is None:
                 raise ValueError("Must specify sda and scl pins")
+            from machine import I2C, Pin
             self._i2c = I2C(sda=Pin(sda), scl=Pin(scl))
         else:
             self._i2c = i2c
+        self._registers = RegisterShadow(self._i2c, self._address,
+                                         self._write_registers)
+        # The sensor may have been reset or replaced since the last
+        # driver wrote to it
+        self._registers.invalidate()
 
-        self._read_chip_info()
-        self._read_trimming()
+        entry = None
+        if cache is not None:
+            if trust_cache:
+                entry = cache.get(self._address, bus_id=bus_id)
+            else:
+                self._read_chip_info()
+                entry = cache.get(self._address, chip_id=self._chip_id,
+                                  bus_id=bus_id)
+        if entry is None:
+            if self._chip_id is None:
+                self._read_chip_info()
+            trimmings = self._read_trimming()
+            if cache is not None:
+                cache.put(self._address, self._chip_id,
+                          self._chip_version, trimmings, bus_id=bus_id)
+        else:
+            self._chip_id, self._chip_version, trimmings = entry
+            self._set_trimming(trimmings)
 
     def _read_trimming(self):
-        # Trimmings for temperature
         trimming_start = self.REGISTERS["TRIMMING_START"]
         trimmings = self.i2c.readfrom_mem(self.address,
                                           trimming_start,
                                           self.TRIMMING_LENGTH)
-        # combine the trims
-        first = [i for index, i in enumerate(trimmings) if not index%2]
-        second = [i for index, i in enumerate(trimmings) if index%2]
-        trims = []
-        for first, second in zip(first, second):
-            trims.append(self._combine_bytes(first, second))
-        trims[4:] = [value if value < 32768 else value-65536 for value in trims[4:]]
+        self._set_trimming(trimmings)
+        return trimmings
+
+    def _set_trimming(self, trimmings):
+        trims = struct.unpack(self.TRIMMING_FORMAT, trimmings)
         self._trimming["temperature"] = trims[:3]
         self._trimming["pressure"] = trims[3:]
+        # Flat copy (T1-T3, P1-P9) for the batch compensation
+        self._trimming_flat = array("i", trims)
+        # P1-P9 for the integer pressure, with the shifts of the
+        # constant terms done once
+        (dig1, dig2, dig3, dig4, dig5, dig6,
+         dig7, dig8, dig9) = trims[3:]
+        self._pressure_int_trims = (dig1, dig2, dig3, dig4 << 12, dig5, dig6,
+                                    dig7 << 4, dig8 << 11, dig9)
 
     def _read_data(self):
-        data = self.i2c.readfrom_mem(self.address,
-                                     self.REGISTERS["DATA"],
-                                     8)
+        data = self._buffer
+        self.i2c.readfrom_mem_into(self.address,
+                                   self.REGISTERS["DATA"],
+                                   data)
         pres_raw = (data[0] << 12) | (data[1] << 4) | (data[2] >> 4)
         temp_raw = (data[3] << 12) | (data[4] << 4) | (data[5] >> 4)
         hum_raw = (data[6] << 8) | data[7]
 
         self._data["temperature"] = self._refine_temperature(temp_raw)
-        self._data["pressure"] = self._refine_pressure(pres_raw)
+        if self._compensation == Compensation.INTEGER:
+            self._data["pressure"] = self._refine_pressure_int(
+                pres_raw, self._data["temperature"])
+        else:
+            self._data["pressure"] = self._refine_pressure(pres_raw)
         self._data["humidity"] = self._refine_humidity(hum_raw)
+        if (self._reading is not None and
+                self._compensation == Compensation.INTEGER):
+            # No new object, the integer samples do not allocate
+            self._reading._set(temp_raw, pres_raw, hum_raw,
+                               self._data["temperature"],
+                               self._data["pressure"],
+                               self._data["humidity"],
+                               self._compensation,
+                               self._sea_level_pressure,
+                               self._elevation)
+        else:
+            self._reading = Reading(temp_raw, pres_raw, hum_raw,
+                                    self._data["temperature"],
+                                    self._data["pressure"],
+                                    self._data["humidity"],
+                                    self._compensation,
+                                    self._sea_level_pressure,
+                                    self._elevation)
+        return self._reading
 
-    def _write_conf(self):
+    def _write_registers(self, register, buf):
+        self.i2c.writeto_mem(self.address, register, buf)
+
+    def _conf_value(self):
         temp_over = self._config["temperature_oversampling"]
         press_over = self._config["pressure_oversampling"]
         mode = self._config["mode"]
-        value = (temp_over << 5) | (press_over << 2) | mode
-        self.i2c.writeto_mem(self.address,
-                             self.REGISTERS["CRTL_MEAS"],
-                             chr(value))
+        return (temp_over << 5) | (press_over << 2) | mode
 
-    def _write_normal_conf(self):
+    def _normal_conf_value(self):
         standby = self._normal_config["time_standby"]
         filter_mod = self._normal_config["filter"]
-        value = (standby << 5 | filter_mod << 2 | 0)
-        self.i2c.writeto_mem(self.address,
-                             self.REGISTERS["CONFIG"],
-                             chr(value))
-    @staticmethod
-    def _combine_bytes(first, second):
-        return (second << 8) + first
+        return (standby << 5 | filter_mod << 2 | 0)
+
+    def _write_conf(self):
+        # In forced mode every write starts a conversion, so it is
+        # never skipped
+        self._registers.write(self.REGISTERS["CRTL_MEAS"],
+                              self._conf_value(),
+                              force=self.mode == Modes.FORCE)
+
+    def _write_normal_conf(self):
+        self._registers.write(self.REGISTERS["CONFIG"],
+                              self._normal_conf_value())
 
     def _read_chip_info(self):
         (self._chip_id,
@@ -156,6 +273,152 @@ class BME280(object):
         p_refined = p_refined + (var1 + var2 + dig7) / 16.0
         return p_refined
 
+    def _refine_pressure_int(self, pressure, temperature):
+        """
+        Integer version of _refine_pressure, returns Pa * 256
+        """
+        # The 64 bit integer witchcraft from page 23 of the datasheet,
+        # rearranged so every intermediate value fits in a small int
+        # (30 bits) of the 32 bit ports and needs no heap
+
+        (dig1, dig2, dig3, dig4, dig5, dig6,
+         dig7, dig8, dig9) = self._pressure_int_trims
+
+        var1 = temperature - 128000
+        # var1**2 / 256, from its 8 bit halves
+        high = var1 >> 8
+        low = var1 & 0xff
+        square = (((high * high) << 8) + ((high * low) << 1)
+                  + ((low * low) >> 8))
+        # Offset of the raw pressure (var2 >> 31 of the datasheet), * 256
+        offset = dig4 + ((var1 * dig5) >> 6) + (((square >> 4) * dig6) >> 11)
+        # Divisor (var1 of the datasheet) as dig1 * 1024 * (1 + corr / 2**26)
+        corr = dig2 * (var1 >> 9) + ((dig2 * (var1 & 0x1ff)) >> 9)
+        corr += (((dig3 * (square >> 12)) >> 9)
+                 + ((dig3 * (square & 0xfff)) >> 21))
+        divisor = ((dig1 << 10) + ((dig1 * (corr >> 12)) >> 4)
+                   + ((dig1 * (corr & 0xfff)) >> 16))
+        if divisor <= 0:
+            return 0
+
+        # p_refined = numerator * 3125 * 2**11 / divisor, by long
+        # division
+        numerator = ((1048576 - pressure) << 8) - offset
+        p_refined = numerator // divisor
+        remainder = numerator - p_refined * divisor
+        for step in self.PRESSURE_DIVISION_STEPS:
+            remainder *= step
+            digit = remainder // divisor
+            p_refined = p_refined * step + digit
+            remainder -= digit * divisor
+
+        # p_refined * (dig9 * p_refined / 2**43 + dig8 / 2**19), from the
+        # 13 and 15 bit halves of the factors
+        high = p_refined >> 13
+        low = p_refined & 0x1fff
+        factor = dig9 * high + ((dig9 * low) >> 13) + dig8
+        var1 = factor >> 15
+        var2 = factor & 0x7fff
+        p_refined += (((high * var1) >> 2) + ((high * var2) >> 17)
+                      + ((low * var1) >> 15) + ((low * var2) >> 30))
+        return p_refined + dig7
+
+    def compensate_batch(self, raw_buffer):
+        """
+        Compensates a buffer of raw DATA bursts in a single pass.
+
+        Parameters
+        ----------
+        raw_buffer : bytes, bytearray or array('B')
+            Consecutive 8 byte bursts as read from the DATA registers
+            (pressure, temperature and humidity).
+
+        Returns
+        -------
+        temperatures : array('f') or array('i')
+            The refined temperatures (same units as temperature). With
+            the integer compensation, in the units of
+            temperature_fixed.
+        pressures : array('f') or array('i')
+            The refined pressures (same units as pressure). With the
+            integer compensation, in the units of pressure_fixed.
+
+        Raises
+        ------
+        ValueError : If the buffer length is not a multiple of the
+                     burst length
+        """
+        length = len(raw_buffer)
+        if length % self.DATA_LENGTH:
+            text = "Buffer with size {} is not a multiple of {}"
+            text = text.format(length, self.DATA_LENGTH)
+            raise ValueError(text)
+
+        if self._compensation == Compensation.INTEGER:
+            return self._compensate_batch_int(raw_buffer)
+
+        (tdig1, tdig2, tdig3, pdig1, pdig2, pdig3, pdig4, pdig5, pdig6,
+         pdig7, pdig8, pdig9) = self._trimming_flat
+
+        temperatures = array("f")
+        pressures = array("f")
+        for start in range(0, length, self.DATA_LENGTH):
+            pres_raw = ((raw_buffer[start] << 12)
+                        | (raw_buffer[start + 1] << 4)
+                        | (raw_buffer[start + 2] >> 4))
+            temp_raw = ((raw_buffer[start + 3] << 12)
+                        | (raw_buffer[start + 4] << 4)
+                        | (raw_buffer[start + 5] >> 4))
+
+            # Same formulas as _refine_temperature and _refine_pressure
+            var1 = (((temp_raw >> 3) - (tdig1 << 1)) * tdig2) >> 11
+            var2 = (((((temp_raw >> 4) - tdig1)
+                      * ((temp_raw >> 4) - tdig1)) >> 12) * tdig3) >> 14
+            temperature_fine = var1 + var2
+            temperatures.append(((temperature_fine * 5 + 128) >> 8) / 100.)
+
+            var1 = (temperature_fine / 2.0) - 64000.0
+            var2 = var1 * var1 * pdig6 / 32768.0
+            var2 = var2 + var1 * pdig5 * 2.0
+            var2 = (var2 / 4.0) + (pdig4 * 65536.0)
+            var1 = (pdig3 * var1 * var1 / 524288.0 + pdig2 * var1) / 524288.0
+            var1 = (1.0 + var1 / 32768.0) * pdig1
+            if var1 == 0.0:
+                pressures.append(0.0)
+                continue
+            p_refined = 1048576.0 - pres_raw
+            p_refined = (p_refined - (var2 / 4096.0)) * 6250.0 / var1
+            var1 = pdig9 * p_refined * p_refined / 2147483648.0
+            var2 = p_refined * pdig8 / 32768.0
+            p_refined = p_refined + (var1 + var2 + pdig7) / 16.0
+            pressures.append(p_refined / 100.0)
+
+        return temperatures, pressures
+
+    def _compensate_batch_int(self, raw_buffer):
+        tdig1, tdig2, tdig3 = self._trimming["temperature"]
+
+        temperatures = array("i")
+        pressures = array("i")
+        for start in range(0, len(raw_buffer), self.DATA_LENGTH):
+            pres_raw = ((raw_buffer[start] << 12)
+                        | (raw_buffer[start + 1] << 4)
+                        | (raw_buffer[start + 2] >> 4))
+            temp_raw = ((raw_buffer[start + 3] << 12)
+                        | (raw_buffer[start + 4] << 4)
+                        | (raw_buffer[start + 5] >> 4))
+
+            # Same formula as _refine_temperature
+            var1 = (((temp_raw >> 3) - (tdig1 << 1)) * tdig2) >> 11
+            var2 = (((((temp_raw >> 4) - tdig1)
+                      * ((temp_raw >> 4) - tdig1)) >> 12) * tdig3) >> 14
+            temperature_fine = var1 + var2
+            temperatures.append((temperature_fine * 5 + 128) >> 8)
+            pressures.append(self._refine_pressure_int(pres_raw,
+                                                       temperature_fine))
+
+        return temperatures, pressures
+
     @property
     def address(self):
         """
@@ -165,6 +428,9 @@ class BME280(object):
     @address.setter
     def address(self, value):
         self._address = value
+        self._registers = RegisterShadow(self._i2c, self._address,
+                                         self._write_registers)
+        self._registers.invalidate()
 
     @property
     def i2c(self):
@@ -187,19 +453,118 @@ class BME280(object):
         """
         return self._chip_version
 
+    @property
+    def reading(self):
+        """
+        The last Reading of the sensor
+        """
+        return self._reading
+
     @property
     def temperature(self):
         """
         Returns the refined temperature
         """
-        return float(((self._data["temperature"] * 5) +128) >> 8)/100.
+        return self._reading.temperature
+
+    @property
+    def temperature_fixed(self):
+        """
+        Returns the refined temperature as an integer in 0.01 C
+        """
+        return self._reading.temperature_fixed
 
     @property
     def pressure(self):
         """
         Returns the refined pressure
         """
-        return self._data["pressure"] / 100.0
+        return self._reading.pressure
+
+    @property
+    def pressure_fixed(self):
+        """
+        Returns the refined pressure as an integer in Pa * 256
+        """
+        return self._reading.pressure_fixed
+
+    @property
+    def sea_level_pressure(self):
+        """
+        Pressure at sea level (hPa) used for the altitude of the next
+        readings. Default 1013.25
+        """
+        return self._sea_level_pressure
+
+    @sea_level_pressure.setter
+    def sea_level_pressure(self, value):
+        self._sea_level_pressure = value
+
+    @property
+    def elevation(self):
+        """
+        Elevation of the sensor (m) used for the sea level pressure of
+        the next readings. Default 0
+        """
+        return self._elevation
+
+    @elevation.setter
+    def elevation(self, value):
+        self._elevation = value
+
+    @property
+    def compensation(self):
+        """
+        The compensation algorithm, see the Compensation object
+        """
+        return self._compensation
+
+    @compensation.setter
+    def compensation(self, value):
+        self._compensation = value
+
+    @property
+    def measurement_time(self):
+        """
+        Maximum measurement time (ms) for the current oversampling
+        (datasheet, appendix B)
+        """
+        return self._measurement_time(self.temp_over, self.press_over)
+
+    @classmethod
+    def _measurement_time(cls, temp_over, press_over):
+        temp_factor = cls.OVERSAMPLING_FACTORS[temp_over]
+        press_factor = cls.OVERSAMPLING_FACTORS[press_over]
+        time_ms = 1.25 + 2.3 * temp_factor
+        if press_factor:
+            time_ms += 2.3 * press_factor + 0.575
+        return time_ms
+
+    @property
+    def measuring(self):
+        """
+        True while the sensor is running a conversion
+        """
+        value = self.i2c.readfrom_mem(self.address,
+                                      self.REGISTERS["STATUS"], 1)[0]
+        return bool(value & self.MEASURING_BIT)
+
+    def _measurement_polls(self):
+        # Polls of the measuring bit before reaching the maximum
+        # measurement time
+        return int(self.measurement_time / (self.POLL_INTERVAL * 1000)) + 1
+
+    def _wait_measurement(self):
+        for _ in range(self._measurement_polls()):
+            time.sleep(self.POLL_INTERVAL)
+            if not self.measuring:
+                return
+
+    async def _wait_measurement_async(self):
+        for _ in range(self._measurement_polls()):
+            await asyncio.sleep(self.POLL_INTERVAL)
+            if not self.measuring:
+                return
 
     @property
     def data(self):
@@ -285,20 +650,459 @@ class BME280(object):
         self._normal_config["filter"] = value
         self._write_normal_conf()
 
+    def configure(self, target_rate_hz=1, max_noise_pa=None):
+        """
+        Chooses the oversampling, standby and filter for a sample rate
+        and a pressure noise budget, and writes them to the sensor.
+
+        Among the combinations that reach the rate and the noise the
+        one with the lowest current is used (with the weakest filter
+        on ties). The pressure noise of the datasheet is assumed to
+        drop with the filter as 1/sqrt(2*coefficient - 1).
+
+        Parameters
+        ----------
+        target_rate_hz : float (optional)
+            Samples per second. In normal mode the standby is chosen so
+            the output data rate is at least this one. Default 1.
+        max_noise_pa : float or None (optional)
+            Maximum RMS pressure noise (Pa). If None the noise is not
+            constrained. Default None.
+
+        Returns
+        -------
+        dict with the chosen settings ("temp_over", "press_over",
+        "standby", "filter") and the expected "measurement_time" (ms),
+        "rate" (Hz), "noise" (Pa), "response_time" (s, to reach 75% of
+        a step) and "current" (uA).
+
+        Raises
+        ------
+        ValueError : If no combination reaches the rate and noise
+        """
+        if target_rate_hz <= 0:
+            raise ValueError("The rate must be positive")
+        period = 1000. / target_rate_hz
+
+        best = None
+        for press_over in range(Oversampling.x1, Oversampling.x16 + 1):
+            # Recommended temperature oversampling (datasheet, 3.5)
+            if press_over == Oversampling.x16:
+                temp_over = Oversampling.x2
+            else:
+                temp_over = Oversampling.x1
+            time_ms = self._measurement_time(temp_over, press_over)
+
+            if self.mode == Modes.NORMAL:
+                standby = None
+                for code, standby_ms in enumerate(self.STANDBY_TIMES):
+                    if time_ms + standby_ms > period:
+                        continue
+                    if (standby is None
+                            or standby_ms > self.STANDBY_TIMES[standby]):
+                        standby = code
+                if standby is None:
+                    continue
+                rate = 1000. / (time_ms + self.STANDBY_TIMES[standby])
+            else:
+                if time_ms > period:
+                    continue
+                standby = self.standby
+                rate = target_rate_hz
+
+            charge = (2.3 * self.OVERSAMPLING_FACTORS[temp_over]
+                      * self.TEMPERATURE_CURRENT
+                      + 2.3 * self.OVERSAMPLING_FACTORS[press_over]
+                      * self.PRESSURE_CURRENT)
+            duty = min(1., rate * time_ms / 1000.)
+            current = (rate * charge / 1000.
+                       + (1 - duty) * self.STANDBY_CURRENT)
+
+            for filter_mod, coefficient in enumerate(self.FILTER_COEFFICIENTS):
+                noise = (self.PRESSURE_NOISE[press_over]
+                         / (2 * coefficient - 1) ** 0.5)
+                if max_noise_pa is not None and noise > max_noise_pa:
+                    continue
+                if best is None or current < best["current"]:
+                    best = {"temp_over": temp_over,
+                            "press_over": press_over,
+                            "standby": standby,
+                            "filter": filter_mod,
+                            "measurement_time": time_ms,
+                            "rate": rate,
+                            "noise": noise,
+                            "response_time": (self.FILTER_RESPONSE[filter_mod]
+                                              / rate),
+                            "current": current}
+                break
+
+        if best is None:
+            text = "No configuration reaches {} Hz with {} Pa of noise"
+            raise ValueError(text.format(target_rate_hz, max_noise_pa))
+
+        self._config["temperature_oversampling"] = best["temp_over"]
+        self._config["pressure_oversampling"] = best["press_over"]
+        self._normal_config["time_standby"] = best["standby"]
+        self._normal_config["filter"] = best["filter"]
+        self._apply_configuration()
+        return best
+
+    def _apply_configuration(self):
+        # CONFIG writes may be ignored in normal mode, so CTRL_MEAS
+        # (in sleep mode) and CONFIG are written in one burst before
+        # setting the mode. Forced conversions are started by update.
+        normal_value = self._normal_conf_value()
+        if self._registers.get(self.REGISTERS["CONFIG"]) != normal_value:
+            sleep_value = self._conf_value() & ~0x03 | Modes.SLEEP
+            self._registers.write_block(self.REGISTERS["CRTL_MEAS"],
+                                        (sleep_value, normal_value))
+        if self.mode == Modes.NORMAL:
+            self._write_conf()
+
     def reset(self):
         """
         Resets the sensor
         """
         self.i2c.writeto_mem(self.address, self.REGISTERS["RESET"],
-                             chr(self.RESET_WORD))
+                             bytes((self.RESET_WORD,)))
+        self._registers.invalidate()
 
     def update(self):
         """
-        Updates the readings of the sensor
+        Updates the readings of the sensor and returns the new Reading
         """
         self._write_conf()
-        time.sleep(0.1)
-        self._read_data()
+        self._wait_measurement()
+        return self._read_data()
+
+    async def update_async(self):
+        """
+        Updates the readings of the sensor, yielding to the event loop
+        while the conversion runs, and returns the new Reading
+        """
+        self._write_conf()
+        await self._wait_measurement_async()
+        return self._read_data()
+
+class BME280Group(object):
+    """
+    Several BME280 sensors (in the same or in different buses)
+    measured together: the conversions are triggered in all of them,
+    there is a single wait until none of them is measuring and then all
+    of them are read.
+
+    Parameters
+    ----------
+    sensors : list(BME280)
+        The sensors of the group
+    """
+
+    def __init__(self, sensors):
+        self._sensors = tuple(sensors)
+        if not self._sensors:
+            raise ValueError("A group needs at least one sensor")
+
+    def __len__(self):
+        return len(self._sensors)
+
+    def __iter__(self):
+        return iter(self._sensors)
+
+    def __getitem__(self, index):
+        return self._sensors[index]
+
+    @property
+    def sensors(self):
+        """
+        The sensors of the group
+        """
+        return self._sensors
+
+    @property
+    def measurement_time(self):
+        """
+        Maximum measurement time (ms) of the slowest sensor
+        """
+        return max(sensor.measurement_time for sensor in self._sensors)
+
+    @property
+    def readings(self):
+        """
+        Last Reading of each sensor, in the group order
+        """
+        return tuple(sensor.reading for sensor in self._sensors)
+
+    def _trigger(self):
+        # Starts the conversion in all the sensors, returns the number
+        # of polls to wait for the slowest one
+        for sensor in self._sensors:
+            sensor._write_conf()
+        return max(sensor._measurement_polls() for sensor in self._sensors)
+
+    def _pending(self, first):
+        # First sensor (from first) still measuring, len if none. A
+        # finished sensor does not start measuring again, so the
+        # checked ones are skipped in the next polls
+        sensors = self._sensors
+        while first < len(sensors) and not sensors[first].measuring:
+            first += 1
+        return first
+
+    def _read_all(self):
+        for sensor in self._sensors:
+            sensor._read_data()
+        return self.readings
+
+    def update(self):
+        """
+        Updates the readings of all the sensors and returns them
+        """
+        pending = 0
+        for _ in range(self._trigger()):
+            time.sleep(BME280.POLL_INTERVAL)
+            pending = self._pending(pending)
+            if pending == len(self._sensors):
+                break
+        return self._read_all()
+
+    async def update_async(self):
+        """
+        Awaitable version of update
+        """
+        pending = 0
+        for _ in range(self._trigger()):
+            await asyncio.sleep(BME280.POLL_INTERVAL)
+            pending = self._pending(pending)
+            if pending == len(self._sensors):
+                break
+        return self._read_all()
+
+
+class Reading(object):
+    """
+    A sample of the sensor. The values in physical units and the
+    derived quantities are computed the first time they are read and
+    kept for the next consumers of the same sample.
+
+    Parameters
+    ----------
+    temperature_raw, pressure_raw, humidity_raw : int
+        Raw values read from the sensor
+    temperature_fine : int
+        The refined temperature (t_fine of the datasheet)
+    pressure : float or int
+        The refined pressure (Pa, or Pa * 256 with the integer
+        compensation)
+    humidity : float or None
+        The refined relative humidity (%), None if not available
+    compensation : int
+        Compensation used for the pressure, see Compensation
+    sea_level_pressure : float
+        Reference pressure (hPa) for the altitude
+    elevation : float
+        Elevation (m) of the sensor for the sea level pressure
+    """
+
+    __slots__ = ("temperature_raw", "pressure_raw", "humidity_raw",
+                 "temperature_fine", "humidity", "_pressure",
+                 "_compensation", "_reference", "_elevation",
+                 "_temperature", "_pressure_hpa", "_altitude",
+                 "_sea_level", "_dew_point")
+
+    def __init__(self, temperature_raw, pressure_raw, humidity_raw,
+                 temperature_fine, pressure, humidity, compensation,
+                 sea_level_pressure=1013.25, elevation=0):
+        self._set(temperature_raw, pressure_raw, humidity_raw,
+                  temperature_fine, pressure, humidity, compensation,
+                  sea_level_pressure, elevation)
+
+    def _set(self, temperature_raw, pressure_raw, humidity_raw,
+             temperature_fine, pressure, humidity, compensation,
+             sea_level_pressure, elevation):
+        # Replaces the sample, forgetting the derived values
+        self.temperature_raw = temperature_raw
+        self.pressure_raw = pressure_raw
+        self.humidity_raw = humidity_raw
+        self.temperature_fine = temperature_fine
+        self.humidity = humidity
+        self._pressure = pressure
+        self._compensation = compensation
+        self._reference = sea_level_pressure
+        self._elevation = elevation
+        self._temperature = None
+        self._pressure_hpa = None
+        self._altitude = None
+        self._sea_level = None
+        self._dew_point = None
+
+    def __repr__(self):
+        return "Reading(temperature={}, pressure={})".format(self.temperature,
+                                                             self.pressure)
+
+    @property
+    def temperature_fixed(self):
+        """
+        The temperature as an integer in 0.01 C
+        """
+        return ((self.temperature_fine * 5) + 128) >> 8
+
+    @property
+    def temperature(self):
+        """
+        The temperature (C)
+        """
+        if self._temperature is None:
+            self._temperature = self.temperature_fixed / 100.
+        return self._temperature
+
+    @property
+    def pressure_fixed(self):
+        """
+        The pressure as an integer in Pa * 256
+        """
+        if self._compensation == Compensation.INTEGER:
+            return self._pressure
+        return int(self._pressure * 256)
+
+    @property
+    def pressure(self):
+        """
+        The pressure (hPa)
+        """
+        if self._pressure_hpa is None:
+            if self._compensation == Compensation.INTEGER:
+                self._pressure_hpa = self._pressure / 25600.0
+            else:
+                self._pressure_hpa = self._pressure / 100.0
+        return self._pressure_hpa
+
+    @property
+    def altitude(self):
+        """
+        Altitude (m) from the pressure and the sea level pressure
+        """
+        if self._altitude is None:
+            ratio = self.pressure / self._reference
+            self._altitude = 44330.0 * (1 - ratio ** (1 / 5.255))
+        return self._altitude
+
+    @property
+    def sea_level_pressure(self):
+        """
+        Pressure (hPa) reduced to the sea level from the elevation
+        """
+        if self._sea_level is None:
+            factor = (1 - self._elevation / 44330.0) ** 5.255
+            self._sea_level = self.pressure / factor
+        return self._sea_level
+
+    @property
+    def dew_point(self):
+        """
+        Dew point (C) with the Magnus formula, None without humidity
+        """
+        if not self.humidity:
+            return None
+        if self._dew_point is None:
+            temperature = self.temperature
+            gamma = (math.log(self.humidity / 100.)
+                     + 17.62 * temperature / (243.12 + temperature))
+            self._dew_point = 243.12 * gamma / (17.62 - gamma)
+        return self._dew_point
+
+
+class CalibrationCache(object):
+    """
+    Stores the chip info and trimming of BME280 sensors in a flash
+    file, so they do not have to be read from the bus on every boot.
+    The sensors are identified by their bus number and address.
+
+    Parameters
+    ----------
+    path : str (optional)
+        File where the calibrations are stored. Default "bme280.cal"
+    """
+
+    MAGIC = b"BMC2"
+    RECORD_FORMAT = "<BBBB24s"
+
+    def __init__(self, path="bme280.cal"):
+        self._path = path
+
+    def _load(self):
+        try:
+            with open(self._path, "rb") as fobj:
+                return fobj.read()
+        except OSError:
+            return b""
+
+    def _save(self, blob):
+        with open(self._path, "wb") as fobj:
+            fobj.write(blob)
+
+    def _entries(self):
+        blob = self._load()
+        entries = {}
+        if blob[:len(self.MAGIC)] != self.MAGIC:
+            return entries
+        size = struct.calcsize(self.RECORD_FORMAT)
+        for start in range(len(self.MAGIC), len(blob) - size + 1, size):
+            (bus_id, address, chip_id,
+             chip_version, trimmings) = struct.unpack_from(self.RECORD_FORMAT,
+                                                           blob, start)
+            entries[(bus_id, address)] = (chip_id, chip_version, trimmings)
+        return entries
+
+    def get(self, address, chip_id=None, bus_id=0):
+        """
+        Returns the cached (chip_id, chip_version, trimmings) for the
+        address in the bus, or None if there is no entry (or the chip
+        id does not match)
+        """
+        entry = self._entries().get((bus_id, address))
+        if entry is None:
+            return None
+        if chip_id is not None and entry[0] != chip_id:
+            return None
+        return entry
+
+    def put(self, address, chip_id, chip_version, trimmings, bus_id=0):
+        """
+        Stores the calibration of the sensor at address in the bus
+        """
+        entries = self._entries()
+        entries[(bus_id, address)] = (chip_id, chip_version,
+                                      bytes(trimmings))
+        blob = bytearray(self.MAGIC)
+        for (bus_id, address), entry in entries.items():
+            blob.extend(struct.pack(self.RECORD_FORMAT, bus_id, address,
+                                    *entry))
+        self._save(blob)
+
+    def clear(self):
+        """
+        Removes all the cached calibrations
+        """
+        self._save(self.MAGIC)
+
+
+class RTCCalibrationCache(CalibrationCache):
+    """
+    Calibration cache stored in the RTC memory, which survives deep
+    sleep but not a power cycle. The whole RTC memory is used.
+    """
+
+    def __init__(self):
+        super(RTCCalibrationCache, self).__init__(path=None)
+
+    def _load(self):
+        from machine import RTC
+        return RTC().memory()
+
+    def _save(self, blob):
+        from machine import RTC
+        RTC().memory(blob)
+
 
 class Modes(object):
     """
@@ -308,6 +1112,13 @@ class Modes(object):
     FORCE = 1
     NORMAL = 3
 
+class Compensation(object):
+    """
+    Compensation algorithms (datasheet, section 8)
+    """
+    FLOAT = 0
+    INTEGER = 1
+
 class Oversampling(object):
     """
     Different Oversampling
@@ -1,5 +1,5 @@
 from machine import Pin
-import utime
+import time
 
 class Button(Pin):
     """
@@ -8,13 +8,13 @@ class Button(Pin):
 
     def __init__(self, *args, debounce_time=0.1, **kwargs):
         self._debounce_time = debounce_time
-        self._last_action = utime.time()
+        self._last_action = time.time()
         self._irq_function = lambda *args: None
         super(Button, self).__init__(*args, **kwargs)
 
 
     def _callback(self, arg):
-        current = utime.time()
+        current = time.time()
         if (current - self._last_action) > self._debounce_time:
             self._last_action = current
             self._irq_function(arg)
@@ -0,0 +1,179 @@
+"""
+Strip chart for the SSD1306 screens. Each new value scrolls the area
+of the chart in place and only the newest columns are drawn, the whole
+chart is redrawn only when its vertical range changes.
+"""
+import framebuf
+try:
+    from .storage import Deque
+except ImportError:
+    from storage import Deque
+
+
+class StripChart(object):
+    """
+    Chart of the last values in an area of the screen, with the newest
+    one on the right
+
+    Parameters
+    ----------
+    display : SSD1306
+        The screen where the chart is drawn
+    x, y : int
+        Top left corner of the chart. y must be a multiple of 8 (the
+        area starts at a page of the screen)
+    width, height : int
+        Size of the chart in pixels
+    step : int (optional)
+        Columns between two consecutive values. Default 4
+    scale : int (optional)
+        The values are stored as integers, multiplied by scale.
+        Default 100 (two decimals)
+
+    Notes
+    -----
+    The chart draws on a FrameBuffer over the buffer of the screen,
+    which spans whole rows of the screen, so if x is not 0 the chart
+    can not reach the last page of the screen.
+    """
+
+    def __init__(self, display, x, y, width, height, step=4, scale=100):
+        if y % 8:
+            raise ValueError("y must be a multiple of 8")
+        self._display = display
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self._step = step
+        self._scale = scale
+        offset = (y // 8) * display.width + x
+        self._fbuf = framebuf.FrameBuffer(display.buffer[offset:], width,
+                                          height, framebuf.MONO_VLSB,
+                                          display.width)
+        # One more value than the ones that fit, so the line from it to
+        # the next one is kept when the chart is redrawn
+        max_len = (width - 1) // step + 2
+        self._values = Deque(max_len=max_len, typecode="i")
+        # The range is read on each push
+        self._lows = Deque(max_len=max_len, typecode="i", extremes=True)
+        self._highs = Deque(max_len=max_len, typecode="i", extremes=True)
+        # Range of the y axis and the fixed point (16 bits) factor to
+        # convert the values to pixels
+        self._range = None
+        self._factor = 0
+
+    def push(self, value, low=None, high=None):
+        """
+        Adds a new value, scrolling the chart one step to the left
+
+        Parameters
+        ----------
+        value : float
+            The new value
+        low, high : float (optional)
+            Range of the measures represented by the value, drawn as a
+            vertical line. Default the value itself
+
+        Returns
+        -------
+        True if the range of the chart changed, so it was redrawn
+        """
+        self._append(value, low, high)
+        if self._update_range():
+            self.redraw()
+            return True
+
+        fbuf = self._fbuf
+        step = self._step
+        fbuf.scroll(-step, 0)
+        fbuf.fill_rect(self.width - step, 0, step, self.height, 0)
+        self._draw(len(self._values) - 1, self.width - 1)
+        self._display.mark_dirty(self.x, self.y, self.width, self.height)
+        return False
+
+    def load(self, values, lows=None, highs=None):
+        """
+        Replaces the values of the chart and redraws it
+
+        Parameters
+        ----------
+        values : iterable(float)
+            The values, from the oldest to the newest
+        lows, highs : iterable(float) (optional)
+            Range of the measures represented by each value
+        """
+        self._values.clear()
+        self._lows.clear()
+        self._highs.clear()
+        values = list(values)
+        lows = values if lows is None else lows
+        highs = values if highs is None else highs
+        for value, low, high in zip(values, lows, highs):
+            self._append(value, low, high)
+        self._update_range()
+        self.redraw()
+
+    def clear(self):
+        """
+        Removes all the values and clears the area of the chart
+        """
+        self.load(())
+
+    def redraw(self):
+        """
+        Draws all the values of the chart again
+        """
+        self._fbuf.fill(0)
+        count = len(self._values)
+        right = self.width - 1
+        for index in range(count):
+            self._draw(index, right - (count - 1 - index) * self._step)
+        self._display.mark_dirty(self.x, self.y, self.width, self.height)
+
+    @property
+    def range(self):
+        """
+        Lowest and highest values represented in the chart (None if
+        empty)
+        """
+        if self._range is None:
+            return None
+        return (self._range[0] / self._scale, self._range[1] / self._scale)
+
+    def _append(self, value, low, high):
+        scale = self._scale
+        value = int(value * scale)
+        self._values.append(value)
+        self._lows.append(value if low is None else int(low * scale))
+        self._highs.append(value if high is None else int(high * scale))
+
+    def _update_range(self):
+        # Recomputes the scale if the range changed
+        if not len(self._values):
+            self._range = None
+            return True
+        new_range = (self._lows.minimum, self._highs.maximum)
+        if new_range == self._range:
+            return False
+        self._range = new_range
+        span = max(new_range[1] - new_range[0], 1)
+        self._factor = ((self.height - 1) << 16) // span
+        return True
+
+    def _ycoord(self, value):
+        return (self.height - 1 -
+                (((value - self._range[0]) * self._factor) >> 16))
+
+    def _draw(self, index, xcoord):
+        # Range and line from the previous value of a single value
+        fbuf = self._fbuf
+        ycoord = self._ycoord(self._values[index])
+        top = self._ycoord(self._highs[index])
+        bottom = self._ycoord(self._lows[index])
+        fbuf.vline(xcoord, top, bottom - top + 1, 1)
+        if index:
+            fbuf.line(xcoord - self._step, self._ycoord(self._values[index - 1]),
+                      xcoord, ycoord, 1)
+        else:
+            fbuf.pixel(xcoord, ycoord, 1)
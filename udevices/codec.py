@@ -0,0 +1,140 @@
+"""
+Compact binary frames with timestamped records, to send a batch of
+measures in a single message. Only depends on struct, so the file can
+be copied to the host that receives the frames.
+
+Frame layout (little endian):
+
+  * header: magic b"UF", version (B), dimension (B), count (H), first
+    timestamp (L)
+  * one scale (H) per dimension, the values are sent as round(value *
+    scale)
+  * per record: the timestamp increment as a varint and the increment
+    of each scaled value as a zigzag varint
+"""
+import struct
+
+MAGIC = b"UF"
+VERSION = 1
+HEADER_FORMAT = "<2sBBHL"
+
+
+def _write_varint(buf, value):
+    while value > 0x7f:
+        buf.append((value & 0x7f) | 0x80)
+        value >>= 7
+    buf.append(value)
+
+
+def _read_varint(frame, position):
+    value = 0
+    shift = 0
+    while True:
+        byte = frame[position]
+        position += 1
+        value |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return value, position
+        shift += 7
+
+
+def _zigzag(value):
+    return value << 1 if value >= 0 else (-value << 1) - 1
+
+
+def _unzigzag(value):
+    return value >> 1 if not value & 1 else -((value + 1) >> 1)
+
+
+def encode_frame(timestamps, columns, scales):
+    """
+    Packs timestamped records in a frame
+
+    Parameters
+    ----------
+    timestamps : iterable(int)
+        Non decreasing timestamps of the records
+    columns : list(iterable(float))
+        The values of each dimension, in the order of the timestamps
+    scales : list(int)
+        Scale of each dimension (e.g. 100 to keep two decimals)
+
+    Returns
+    -------
+    bytes with the frame
+
+    Raises
+    ------
+    ValueError : If the number of scales does not match the columns or
+                 the timestamps go backwards
+    """
+    dimension = len(columns)
+    if len(scales) != dimension:
+        raise ValueError("One scale per column is needed")
+
+    body = bytearray()
+    for scale in scales:
+        body.extend(struct.pack("<H", scale))
+
+    count = 0
+    first = 0
+    last_time = None
+    last_values = [0] * dimension
+    for record in zip(timestamps, *columns):
+        if last_time is None:
+            first = last_time = record[0]
+        if record[0] < last_time:
+            raise ValueError("The timestamps must not decrease")
+        _write_varint(body, record[0] - last_time)
+        last_time = record[0]
+        for index in range(dimension):
+            value = int(round(record[index + 1] * scales[index]))
+            _write_varint(body, _zigzag(value - last_values[index]))
+            last_values[index] = value
+        count += 1
+
+    header = struct.pack(HEADER_FORMAT, MAGIC, VERSION, dimension, count,
+                         first)
+    return header + body
+
+
+def decode_frame(frame):
+    """
+    Unpacks a frame created by encode_frame
+
+    Returns
+    -------
+    timestamps : list(int)
+    columns : list(list(float))
+
+    Raises
+    ------
+    ValueError : If the frame is not valid
+    """
+    header_size = struct.calcsize(HEADER_FORMAT)
+    if len(frame) < header_size:
+        raise ValueError("Frame too short")
+    (magic, version, dimension,
+     count, last_time) = struct.unpack_from(HEADER_FORMAT, frame)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Unknown frame format")
+
+    position = header_size
+    scales = struct.unpack_from("<{}H".format(dimension), frame, position)
+    position += 2 * dimension
+
+    timestamps = []
+    columns = [[] for _ in range(dimension)]
+    last_values = [0] * dimension
+    try:
+        for _ in range(count):
+            delta, position = _read_varint(frame, position)
+            last_time += delta
+            timestamps.append(last_time)
+            for index in range(dimension):
+                delta, position = _read_varint(frame, position)
+                last_values[index] += _unzigzag(delta)
+                columns[index].append(last_values[index] / scales[index])
+    except IndexError:
+        raise ValueError("Truncated frame")
+    return timestamps, columns
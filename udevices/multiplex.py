@@ -0,0 +1,183 @@
+"""
+Refresh of multiplexed LEDs (matrices, banks of 7 segment digits...)
+driven by shift registers, with brightness levels by binary code
+modulation
+"""
+
+
+class Multiplexer(object):
+    """
+    Refreshes the outputs of a shift register chain from a timer. Each
+    row (the group of LEDs lit at the same time) is shown during
+    2**planes - 1 ticks, split in one frame per bit plane of the
+    brightness, with plane p shown during 2**p ticks.
+
+    The frames are precomputed in a buffer. The interrupt only shifts
+    out the next one, without allocating memory, and the application
+    only changes the buffer (set_output, set_row).
+
+    Parameters
+    ----------
+    register : ShiftRegister or SPIShiftRegister
+        The chain of registers, with the outputs of all the rows
+    rows : int (optional)
+        Number of rows. Default 1
+    planes : int (optional)
+        Bits of the brightness levels (0 to 2**planes - 1). Default 1
+        (on/off)
+    row_select : list(int) (optional)
+        Value of the outputs that enable each row, added to all its
+        frames. Default None (nothing added)
+    timer_id : int (optional)
+        The machine.Timer to use. Default 0
+
+    Notes
+    -----
+    The refresh rate of the whole display is
+    freq / (rows * (2**planes - 1)).
+    """
+
+    def __init__(self, register, rows=1, planes=1, row_select=None,
+                 timer_id=0):
+        if row_select is not None and len(row_select) != rows:
+            raise ValueError("One row_select value per row is needed")
+        self._register = register
+        self._rows = rows
+        self._planes = planes
+        self._max_level = (1 << planes) - 1
+        self._row_select = row_select
+        self._nbytes = (register.nbits + 7) // 8
+        self._frames = bytearray(rows * planes * self._nbytes)
+        # Frame of each row and plane, in the order shown
+        frames = memoryview(self._frames)
+        self._views = [frames[index * self._nbytes:(index + 1) * self._nbytes]
+                       for index in range(rows * planes)]
+        self.clear()
+
+        # State of the refresh, the first tick shows the first frame
+        self._row = rows - 1
+        self._plane = planes - 1
+        self._ticks = 1
+        # Bound methods are created once, the interrupt can not allocate
+        self._shift_out = register.shift_out
+        self._callback = self._tick
+        from machine import Timer
+        self._timer = Timer(timer_id)
+
+    def start(self, freq):
+        """
+        Starts the refresh
+
+        Parameters
+        ----------
+        freq : int
+            Ticks per second
+        """
+        self._timer.init(freq=freq, mode=self._timer.PERIODIC,
+                         callback=self._callback)
+
+    def stop(self):
+        """
+        Stops the refresh (the outputs keep the last frame)
+        """
+        self._timer.deinit()
+
+    def _tick(self, _):
+        ticks = self._ticks - 1
+        if ticks:
+            self._ticks = ticks
+            return
+        row = self._row
+        plane = self._plane + 1
+        if plane == self._planes:
+            plane = 0
+            row += 1
+            if row == self._rows:
+                row = 0
+            self._row = row
+        self._plane = plane
+        self._ticks = 1 << plane
+        self._shift_out(self._views[row * self._planes + plane])
+
+    def set_output(self, row, bit, level):
+        """
+        Sets the brightness of an output in a row
+
+        Parameters
+        ----------
+        row : int
+            The row
+        bit : int
+            The output (bit of the value of the register)
+        level : int
+            Brightness, from 0 (off) to 2**planes - 1
+        """
+        self._check(row, level)
+        if not 0 <= bit < self._register.nbits:
+            text = "Bit {} out of the register of {} bits"
+            raise ValueError(text.format(bit, self._register.nbits))
+        index = self._nbytes - 1 - bit // 8
+        mask = 1 << (bit % 8)
+        first = row * self._planes
+        for plane in range(self._planes):
+            frame = self._views[first + plane]
+            if (level >> plane) & 1:
+                frame[index] |= mask
+            else:
+                frame[index] &= ~mask & 0xff
+
+    def set_row(self, row, value, level=None):
+        """
+        Sets the outputs of a row, the ones in value with the same
+        brightness and the rest off
+
+        Parameters
+        ----------
+        row : int
+            The row
+        value : int
+            The outputs to turn on
+        level : int (optional)
+            Brightness, from 0 (off) to 2**planes - 1. Default the
+            maximum
+        """
+        if level is None:
+            level = self._max_level
+        self._check(row, level)
+        # The row stays selected even with its outputs off
+        select = 0 if self._row_select is None else self._row_select[row]
+        last = self._nbytes - 1
+        first = row * self._planes
+        for plane in range(self._planes):
+            bits = value | select if (level >> plane) & 1 else select
+            frame = self._views[first + plane]
+            for index in range(self._nbytes):
+                frame[index] = (bits >> (8 * (last - index))) & 0xff
+
+    def clear(self):
+        """
+        Turns off all the outputs
+        """
+        for row in range(self._rows):
+            self.set_row(row, 0)
+
+    def _check(self, row, level):
+        if not 0 <= row < self._rows:
+            raise ValueError("Row {} out of {} rows".format(row, self._rows))
+        if not 0 <= level <= self._max_level:
+            text = "Level {} out of the range 0 - {}"
+            raise ValueError(text.format(level, self._max_level))
+
+    @property
+    def rows(self):
+        """
+        Number of rows
+        """
+        return self._rows
+
+    @property
+    def planes(self):
+        """
+        Bits of the brightness levels
+        """
+        return self._planes
@@ -0,0 +1,107 @@
+"""
+Shadow copy of device registers shared by the drivers, used to skip
+the bus writes that would not change anything
+"""
+
+# (bus, address) -> {register: last written value}. The bus objects are
+# kept as keys (not their id) so a new bus can not take the values of a
+# collected one
+_SHADOWS = {}
+
+
+class RegisterShadow(object):
+    """
+    Keeps the last value written to each register of a device. All the
+    shadows created for the same bus and address share their values.
+
+    Parameters
+    ----------
+    bus : object or None
+        The bus of the device (only used to tell devices apart). None
+        for a shadow that is not shared
+    address : object
+        Address of the device in the bus
+    writer : callable
+        writer(register, buf) must write the bytes in buf starting at
+        register
+    """
+
+    def __init__(self, bus, address, writer):
+        if bus is None:
+            self._values = {}
+        else:
+            self._values = _SHADOWS.setdefault((bus, address), {})
+        self._writer = writer
+
+    def get(self, register):
+        """
+        Last value written to the register (None if unknown)
+        """
+        return self._values.get(register)
+
+    def write(self, register, value, force=False):
+        """
+        Writes the value to the register if it changes it
+
+        Parameters
+        ----------
+        register : int
+            The register to write
+        value : int
+            The byte to write
+        force : bool (optional)
+            Write even if the value is the same. Default False
+
+        Returns
+        -------
+        True if the register was written
+        """
+        if not force and self._values.get(register) == value:
+            return False
+        self._writer(register, bytes((value,)))
+        self._values[register] = value
+        return True
+
+    def write_block(self, register, values, force=False):
+        """
+        Writes consecutive registers in a single burst, that only
+        covers the registers between the first and the last changed
+        ones.
+
+        Parameters
+        ----------
+        register : int
+            The first register
+        values : tuple(int)
+            The bytes to write from register onwards
+        force : bool (optional)
+            Write all of them even if they do not change. Default False
+
+        Returns
+        -------
+        True if any register was written
+        """
+        first = None
+        last = None
+        for offset, value in enumerate(values):
+            if force or self._values.get(register + offset) != value:
+                if first is None:
+                    first = offset
+                last = offset
+        if first is None:
+            return False
+
+        self._writer(register + first, bytes(values[first:last + 1]))
+        for offset in range(first, last + 1):
+            self._values[register + offset] = values[offset]
+        return True
+
+    def invalidate(self, register=None):
+        """
+        Forgets the value of the register (all of them if None), e.g.
+        after a reset of the device
+        """
+        if register is None:
+            self._values.clear()
+        else:
+            self._values.pop(register, None)
@@ -3,19 +3,40 @@
 Implements shift register
 """
 import time
-from machine import Pin
+try:
+    from time import sleep_us
+except ImportError:
+    def sleep_us(delay):
+        time.sleep(delay / 1000000)
 
 class ShiftRegister(object):
     """
-    Impletens an N bit shift register
+    Impletens an N bit shift register, bit banging the data and clock
+    pins
     """
-    DELAY = 0.0001
+    # Delay (us) after each change of the pins. The 74HC595 only needs
+    # a few ns, less than the time to toggle a pin from MicroPython
+    DELAY_US = 0
 
     def __init__(self, datapin, clockpin, shiftpin, nbits=8):
+        from machine import Pin
         self._datapin = Pin(datapin, Pin.OUT)
-        self._clockpin = Pin(clockpin, Pin.OUT)
-        self._shiftpin = Pin(shiftpin, Pin.OUT)
+        # The clock starts low so the first bit gets a rising edge
+        self._clockpin = Pin(clockpin, Pin.OUT, value=0)
+        self._setup(shiftpin, nbits)
+
+    def _setup(self, shiftpin, nbits):
+        # Latch pin and state shared by all the backends
+        from machine import Pin
+        # Low, so the first latch is a rising edge
+        self._shiftpin = Pin(shiftpin, Pin.OUT, value=0)
         self._nbits = nbits
+        self._mask = (1 << nbits) - 1
+        # Last value shifted into the register and the one in the
+        # outputs (None until the first latch)
+        self._value = 0
+        self._latched = None
+        self._depth = 0
 
     def set_byte(self, value, reset=True):
         """
@@ -31,23 +52,40 @@ class ShiftRegister(object):
             True.
 
         """
+        count = self._count_bits(value, reset)
+        self._value = ((self._value << count) | value) & self._mask
+        self._shift(value, count)
+        self._latch()
+        self._latched = self._value
 
-        bits = list('{0:0b}'.format(value))
-        nbits = len(bits)
-        if len(bits) > self.nbits:
-            text = "Value {} exceeds maximum register value {}"
-            text = text.format(value, 2**(self.nbits)-1)
-            raise ValueError(text)
-        self._shiftpin(0)
-        time.sleep(self.DELAY)
-        if reset:
-            for _ in range(self.nbits - nbits):
-                self._set_bit(0)
-        for bit in bits:
-            self._set_bit(int(bit))
-        self._shiftpin(1)
-        time.sleep(self.DELAY)
-        self._shiftpin(0)
+    def write(self, buf):
+        """
+        Shifts the bytes of buf (most significant bit first) and latches
+        them. With chained registers the first byte ends in the last
+        register of the chain.
+
+        Parameters
+        ----------
+        buf : bytes, bytearray or memoryview
+            The bytes to shift
+        """
+        value = self._value
+        for byte in buf:
+            value = (value << 8) | byte
+        self._value = value & self._mask
+        self.shift_out(buf)
+        self._latched = self._value
+
+    def shift_out(self, buf):
+        """
+        Shifts and latches the bytes of buf like write, but without
+        keeping the value of the outputs, so it does not allocate memory
+        and can be called from an interrupt. The bit operations assume
+        that the outputs have not been changed with it.
+        """
+        for byte in buf:
+            self._shift(byte, 8)
+        self._latch()
 
     def reset(self):
         """
@@ -55,12 +93,109 @@ class ShiftRegister(object):
         """
         self.set_byte(0)
 
-    def _set_bit(self, state):
-        self._datapin(state)
-        time.sleep(self.DELAY)
-        self._clockpin(1)
-        time.sleep(self.DELAY)
-        self._clockpin(0)
+    # The outputs can also be changed bit by bit. The changes are only
+    # shifted (the whole register) and latched if they change the
+    # outputs, and inside a transaction they are sent once at its end.
+
+    def set_bit(self, bit):
+        """
+        Sets an output (bit of the value, as in set_byte) to 1
+        """
+        self.write_mask(1 << self._check_bit(bit), self._mask)
+
+    def clear_bit(self, bit):
+        """
+        Sets an output (bit of the value, as in set_byte) to 0
+        """
+        self.write_mask(1 << self._check_bit(bit), 0)
+
+    def write_mask(self, mask, value):
+        """
+        Changes the outputs of the bits in mask to the ones in value
+
+        Parameters
+        ----------
+        mask : int
+            The bits to change
+        value : int
+            The new values of the bits (the ones out of mask are
+            ignored)
+        """
+        self._value = ((self._value & ~mask) | (value & mask)) & self._mask
+        if not self._depth:
+            self._update()
+
+    def transaction(self):
+        """
+        Context to group several changes of the outputs, that are sent
+        together when it ends. Transactions can be nested.
+
+        Examples
+        --------
+        >>> with register.transaction():
+        ...     register.set_bit(0)
+        ...     register.clear_bit(5)
+        """
+        return self
+
+    def __enter__(self):
+        self._depth += 1
+        return self
+
+    def __exit__(self, *args):
+        self._depth -= 1
+        if not self._depth:
+            self._update()
+
+    def _update(self):
+        # Sends the value if it differs from the latched one
+        if self._value != self._latched:
+            self._output()
+            self._latched = self._value
+
+    def _output(self):
+        self._shift(self._value, self.nbits)
+        self._latch()
+
+    def _check_bit(self, bit):
+        if not 0 <= bit < self.nbits:
+            text = "Bit {} out of the register of {} bits"
+            raise ValueError(text.format(bit, self.nbits))
+        return bit
+
+    def _count_bits(self, value, reset):
+        # Number of bits to shift for set_byte
+        if value < 0 or value >> self.nbits:
+            text = "Value {} exceeds maximum register value {}"
+            text = text.format(value, 2**(self.nbits)-1)
+            raise ValueError(text)
+        if reset:
+            return self.nbits
+        # Only the significant bits are appended (at least one)
+        count = 1
+        while value >> count:
+            count += 1
+        return count
+
+    def _shift(self, value, count):
+        # The lowest count bits of value, most significant first
+        data = self._datapin
+        clock = self._clockpin
+        delay = self.DELAY_US
+        for bit in range(count - 1, -1, -1):
+            data((value >> bit) & 1)
+            if delay:
+                sleep_us(delay)
+            clock(1)
+            if delay:
+                sleep_us(delay)
+            clock(0)
+
+    def _latch(self):
+        self._shiftpin(1)
+        if self.DELAY_US:
+            sleep_us(self.DELAY_US)
+        self._shiftpin(0)
 
     @property
     def datapin(self):
@@ -88,3 +223,82 @@ class ShiftRegister(object):
         The number of bits of the register
         """
         return self._nbits
+
+    @property
+    def value(self):
+        """
+        The value of the outputs, including the changes of a transaction
+        not sent yet
+        """
+        return self._value
+
+
+class SPIShiftRegister(ShiftRegister):
+    """
+    N bit shift register (or chain of registers) driven by a hardware
+    SPI bus: the data pin is connected to MOSI, the clock pin to SCK and
+    the shift (latch) pin to a normal pin. The whole chain is written
+    with a single spi.write and a single latch.
+
+    Parameters
+    ----------
+    spi : machine.SPI
+        The bus, configured with polarity 0, phase 0 and the most
+        significant bit first
+    shiftpin : int
+        The latch pin
+    nbits : int (optional)
+        Bits of the chain, must be a multiple of 8. Default 8
+    """
+
+    def __init__(self, spi, shiftpin, nbits=8):
+        if nbits % 8:
+            raise ValueError("The SPI bus can only shift whole bytes")
+        self._spi = spi
+        self._datapin = None
+        self._clockpin = None
+        self._setup(shiftpin, nbits)
+        self._buffer = bytearray(nbits // 8)
+
+    def set_byte(self, value, reset=True):
+        """
+        Sets the value of the output
+
+        Parameters
+        ----------
+        value : int
+            Value to which the register will be set
+        reset : bool (optional)
+            If true the previous register will be set to 0. If not the
+            new register will be appended to the previous one. Default
+            True.
+
+        """
+        count = self._count_bits(value, reset)
+        # The bus shifts whole bytes, so the full chain is sent
+        self._value = ((self._value << count) | value) & self._mask
+        self._output()
+        self._latched = self._value
+
+    def shift_out(self, buf):
+        """
+        Shifts the bytes of buf in a single SPI transfer and latches
+        them, without keeping the value of the outputs (see write)
+        """
+        self._spi.write(buf)
+        self._latch()
+
+    def _output(self):
+        value = self._value
+        buf = self._buffer
+        last = len(buf) - 1
+        for index in range(len(buf)):
+            buf[index] = (value >> (8 * (last - index))) & 0xff
+        self.shift_out(buf)
+
+    @property
+    def spi(self):
+        """
+        The SPI bus
+        """
+        return self._spi
@@ -2,6 +2,14 @@
 
 from micropython import const
 import framebuf
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+try:
+    from .registers import RegisterShadow
+except ImportError:
+    from registers import RegisterShadow
 
 
 # register definitions
@@ -25,18 +33,56 @@ SET_CHARGE_PUMP     = const(0x8d)
 
 # Subclassing FrameBuffer provides support for graphics primitives
 # http://docs.micropython.org/en/latest/pyboard/library/framebuf.html
+# With double_buffer the drawing goes to a back buffer and show (or
+# flip followed by step/show_async) copies it to a front buffer that is
+# sent in chunks while the next frame is drawn.
 class SSD1306(framebuf.FrameBuffer):
-    def __init__(self, width, height, external_vcc):
+    def __init__(self, width, height, external_vcc, double_buffer=False):
         self.width = width
         self.height = height
         self.external_vcc = external_vcc
         self.pages = self.height // 8
-        self.buffer = bytearray(self.pages * self.width)
+        # A spare byte before the frame lets the I2C driver prepend the
+        # data control byte without copying the frame
+        self._frame = bytearray(1 + self.pages * self.width)
+        self.buffer = memoryview(self._frame)[1:]
         super().__init__(self.buffer, self.width, self.height, framebuf.MONO_VLSB)
+        self._registers = RegisterShadow(*self._bus_key(),
+                                         writer=self._write_register)
+        # First and last dirty column of each page (none if first > last)
+        self._dirty_first = bytearray(b"\xff" * self.pages)
+        self._dirty_last = bytearray(self.pages)
+        # Column and page window commands sent by show
+        self._window = bytearray((SET_COL_ADDR, 0, 0, SET_PAGE_ADDR, 0, 0))
+        # Cached layers and areas drawn over the composed ones
+        self._layers = {}
+        self._composed = None
+        self._overlay_first = bytearray(b"\xff" * self.pages)
+        self._overlay_last = bytearray(self.pages)
+        if double_buffer:
+            self._front = bytearray(len(self._frame))
+            # Areas of the front buffer not sent yet
+            self._pending_first = bytearray(b"\xff" * self.pages)
+            self._pending_last = bytearray(self.pages)
+        else:
+            self._front = None
         self.init_display()
 
+    def _bus_key(self):
+        # (bus, address) identifying the display for the register shadow
+        # (not shared without a bus)
+        return None, None
+
+    def _write_register(self, register, buf):
+        # The "registers" are the commands, with the value either in
+        # the low bits of the command or as its argument
+        if register in (SET_DISP, SET_NORM_INV):
+            self.write_cmd(register | buf[0])
+        else:
+            self.write_cmds((register, buf[0]))
+
     def init_display(self):
-        for cmd in (
+        self.write_cmds((
             SET_DISP | 0x00, # off
             # address setting
             SET_MEM_ADDR, 0x00, # horizontal
@@ -57,53 +103,320 @@ class SSD1306(framebuf.FrameBuffer):
             SET_NORM_INV, # not inverted
             # charge pump
             SET_CHARGE_PUMP, 0x10 if self.external_vcc else 0x14,
-            SET_DISP | 0x01): # on
-            self.write_cmd(cmd)
+            SET_DISP | 0x01)) # on
+        self._registers.invalidate()
         self.fill(0)
         self.show()
 
     def poweroff(self):
-        self.write_cmd(SET_DISP | 0x00)
+        self._registers.write(SET_DISP, 0x00)
 
     def poweron(self):
-        self.write_cmd(SET_DISP | 0x01)
+        self._registers.write(SET_DISP, 0x01)
 
     def contrast(self, contrast):
-        self.write_cmd(SET_CONTRAST)
-        self.write_cmd(contrast)
+        self._registers.write(SET_CONTRAST, contrast)
 
     def invert(self, invert):
-        self.write_cmd(SET_NORM_INV | (invert & 1))
-
-    def show(self):
-        x0 = 0
-        x1 = self.width - 1
-        if self.width == 64:
-            # displays with width of 64 pixels are shifted by 32
-            x0 += 32
-            x1 += 32
-        self.write_cmd(SET_COL_ADDR)
-        self.write_cmd(x0)
-        self.write_cmd(x1)
-        self.write_cmd(SET_PAGE_ADDR)
-        self.write_cmd(0)
-        self.write_cmd(self.pages - 1)
-        self.write_data(self.buffer)
+        self._registers.write(SET_NORM_INV, invert & 1)
+
+    # Drawing calls mark the area they touch, so show only sends the
+    # changed columns of each page. Changes made directly on the buffer
+    # must be marked with mark_dirty (or sent with show(full=True)).
+
+    def mark_dirty(self, x=0, y=0, width=None, height=None):
+        """
+        Marks an area (the whole screen by default) to be sent by show
+        """
+        if width is None:
+            width = self.width - x
+        if height is None:
+            height = self.height - y
+        self._mark(x, y, x + width - 1, y + height - 1)
+
+    def _mark(self, x0, y0, x1, y1):
+        if x0 > x1:
+            x0, x1 = x1, x0
+        if y0 > y1:
+            y0, y1 = y1, y0
+        if x1 < 0 or y1 < 0 or x0 >= self.width or y0 >= self.height:
+            return
+        x0 = max(x0, 0)
+        x1 = min(x1, self.width - 1)
+        first = self._dirty_first
+        last = self._dirty_last
+        overlay_first = self._overlay_first
+        overlay_last = self._overlay_last
+        for page in range(max(y0, 0) >> 3, (min(y1, self.height - 1) >> 3) + 1):
+            if x0 < first[page]:
+                first[page] = x0
+            if x1 > last[page]:
+                last[page] = x1
+            if x0 < overlay_first[page]:
+                overlay_first[page] = x0
+            if x1 > overlay_last[page]:
+                overlay_last[page] = x1
+
+    # Static content can be rendered once in a layer and used as the
+    # base of each frame with compose, so only the dynamic content is
+    # drawn (and sent) in every frame.
+
+    def add_layer(self, name, draw, width=None, height=None):
+        """
+        Renders a cached layer (of the size of the screen by default)
+        calling draw(fbuf) with a blank FrameBuffer
+        """
+        width = self.width if width is None else width
+        height = self.height if height is None else height
+        buf = bytearray(((height + 7) // 8) * width)
+        fbuf = framebuf.FrameBuffer(buf, width, height, framebuf.MONO_VLSB)
+        draw(fbuf)
+        self._layers[name] = (fbuf, buf, width, height)
+        if self._composed is not None and name in self._composed:
+            self._composed = None
+
+    def remove_layer(self, name):
+        """
+        Removes a cached layer
+        """
+        del self._layers[name]
+        if self._composed is not None and name in self._composed:
+            self._composed = None
+
+    def layer(self, name):
+        """
+        The FrameBuffer of a cached layer
+        """
+        return self._layers[name][0]
+
+    def compose(self, *names):
+        """
+        Starts a frame from cached layers: the first one (of the size of
+        the screen) is copied to the buffer and the rest are drawn over
+        it. If the layers are the same as in the previous compose only
+        the areas drawn since then are marked to be sent.
+        """
+        base = self._layers[names[0]]
+        if base[2] != self.width or base[3] != self.height:
+            raise ValueError("The first layer must fill the screen")
+        self._frame[1:] = base[1]
+        for name in names[1:]:
+            super().blit(self._layers[name][0], 0, 0, 0)
+
+        overlay_first = self._overlay_first
+        overlay_last = self._overlay_last
+        if names == self._composed:
+            for page in range(self.pages):
+                if overlay_first[page] < self._dirty_first[page]:
+                    self._dirty_first[page] = overlay_first[page]
+                if overlay_last[page] > self._dirty_last[page]:
+                    self._dirty_last[page] = overlay_last[page]
+        else:
+            self.mark_dirty()
+            self._composed = names
+        for page in range(self.pages):
+            overlay_first[page] = 0xff
+            overlay_last[page] = 0
+
+    def sprite(self, name, x, y, key=0):
+        """
+        Draws a cached layer at x, y (pixels equal to key are skipped)
+        """
+        fbuf, _, width, height = self._layers[name]
+        super().blit(fbuf, x, y, key)
+        self._mark(x, y, x + width - 1, y + height - 1)
+
+    def write_cmds(self, cmds):
+        """
+        Sends a sequence of commands (and their arguments)
+        """
+        for cmd in cmds:
+            self.write_cmd(cmd)
+
+    def _write_region(self, start, end, frame):
+        # Sends frame[1 + start:1 + end] (the region of the buffer)
+        self.write_data(memoryview(frame)[1 + start:1 + end])
+
+    def fill(self, c):
+        super().fill(c)
+        self._mark(0, 0, self.width - 1, self.height - 1)
+
+    def pixel(self, x, y, *args):
+        if args:
+            self._mark(x, y, x, y)
+        return super().pixel(x, y, *args)
+
+    def hline(self, x, y, w, c):
+        super().hline(x, y, w, c)
+        self._mark(x, y, x + w - 1, y)
+
+    def vline(self, x, y, h, c):
+        super().vline(x, y, h, c)
+        self._mark(x, y, x, y + h - 1)
+
+    def line(self, x1, y1, x2, y2, c):
+        super().line(x1, y1, x2, y2, c)
+        self._mark(x1, y1, x2, y2)
+
+    def rect(self, x, y, w, h, c, *args):
+        super().rect(x, y, w, h, c, *args)
+        self._mark(x, y, x + w - 1, y + h - 1)
+
+    def fill_rect(self, x, y, w, h, c):
+        super().fill_rect(x, y, w, h, c)
+        self._mark(x, y, x + w - 1, y + h - 1)
+
+    def ellipse(self, x, y, xr, yr, c, *args):
+        super().ellipse(x, y, xr, yr, c, *args)
+        self._mark(x - xr, y - yr, x + xr, y + yr)
+
+    def poly(self, x, y, coords, c, *args):
+        super().poly(x, y, coords, c, *args)
+        self.mark_dirty()
+
+    def text(self, string, x, y, *args):
+        super().text(string, x, y, *args)
+        self._mark(x, y, x + 8 * len(string) - 1, y + 7)
+
+    def blit(self, fbuf, x, y, *args):
+        # The size of fbuf is unknown, mark up to the end of the screen
+        super().blit(fbuf, x, y, *args)
+        self._mark(x, y, self.width - 1, self.height - 1)
+
+    def scroll(self, xstep, ystep):
+        super().scroll(xstep, ystep)
+        self.mark_dirty()
+
+    def show(self, full=False):
+        """
+        Sends the changed areas of the buffer to the screen (all of it
+        if full)
+        """
+        if full:
+            self.mark_dirty()
+        if self._front is None:
+            self._send(self._dirty_first, self._dirty_last, self._frame)
+        else:
+            self.flip()
+            self._send(self._pending_first, self._pending_last, self._front)
+
+    def flip(self):
+        """
+        Copies the back buffer to the front one and queues its changed
+        areas to be sent with step (only with double_buffer)
+        """
+        self._front[:] = self._frame
+        first = self._dirty_first
+        last = self._dirty_last
+        for page in range(self.pages):
+            if first[page] < self._pending_first[page]:
+                self._pending_first[page] = first[page]
+            if last[page] > self._pending_last[page]:
+                self._pending_last[page] = last[page]
+            first[page] = 0xff
+            last[page] = 0
+
+    def step(self, windows=1):
+        """
+        Sends up to windows areas of the front buffer (of the buffer
+        without double_buffer). Returns True if there are areas left.
+        """
+        if self._front is None:
+            return self._send(self._dirty_first, self._dirty_last,
+                              self._frame, windows)
+        return self._send(self._pending_first, self._pending_last,
+                          self._front, windows)
+
+    async def show_async(self, windows=1):
+        """
+        Awaitable show, yielding to the event loop every windows areas
+        sent. With double_buffer the next frame can be drawn meanwhile.
+        """
+        if self._front is not None:
+            self.flip()
+        while self.step(windows):
+            await asyncio.sleep(0)
+
+    def _send(self, first, last, frame, windows=None):
+        # Sends the areas between first and last of each page from
+        # frame (up to windows of them). True if areas are left.
+        # displays with width of 64 pixels are shifted by 32
+        offset = 32 if self.width == 64 else 0
+        page = 0
+        while page < self.pages:
+            x0 = first[page]
+            x1 = last[page]
+            if x0 > x1:
+                page += 1
+                continue
+            if windows is not None:
+                if not windows:
+                    return True
+                windows -= 1
+            # Consecutive pages with the same columns share the window
+            end = page + 1
+            while (end < self.pages and first[end] == x0
+                   and last[end] == x1):
+                end += 1
+            window = self._window
+            window[1] = x0 + offset
+            window[2] = x1 + offset
+            window[4] = page
+            window[5] = end - 1
+            self.write_cmds(window)
+            if x0 == 0 and x1 == self.width - 1:
+                self._write_region(page * self.width, end * self.width, frame)
+            else:
+                for row in range(page, end):
+                    start = row * self.width
+                    self._write_region(start + x0, start + x1 + 1, frame)
+            for row in range(page, end):
+                first[row] = 0xff
+                last[row] = 0
+            page = end
+        return False
 
 
 class SSD1306_I2C(SSD1306):
-    def __init__(self, width, height, i2c, addr=0x3c, external_vcc=False):
+    def __init__(self, width, height, i2c, addr=0x3c, external_vcc=False,
+                 double_buffer=False):
         self.i2c = i2c
         self.addr = addr
         self.temp = bytearray(2)
-        super().__init__(width, height, external_vcc)
+        self.cmds = bytearray(32)
+        self.cmds[0] = 0x00 # Co=0, D/C#=0
+        self.data_prefix = b"\x40" # Co=0, D/C#=1
+        super().__init__(width, height, external_vcc, double_buffer)
+
+    def _bus_key(self):
+        return self.i2c, self.addr
 
     def write_cmd(self, cmd):
         self.temp[0] = 0x80 # Co=1, D/C#=0
         self.temp[1] = cmd
         self.i2c.writeto(self.addr, self.temp)
 
+    def write_cmds(self, cmds):
+        # A single transaction per chunk of the preallocated buffer
+        buf = self.cmds
+        view = memoryview(buf)
+        size = len(buf) - 1
+        count = 0
+        for index in range(len(cmds)):
+            count += 1
+            buf[count] = cmds[index]
+            if count == size:
+                self.i2c.writeto(self.addr, buf)
+                count = 0
+        if count:
+            self.i2c.writeto(self.addr, view[:count + 1])
+
     def write_data(self, buf):
+        # Any buffer (or memoryview), in one transaction if the port
+        # has writevto
+        if hasattr(self.i2c, "writevto"):
+            self.i2c.writevto(self.addr, (self.data_prefix, buf))
+            return
         self.temp[0] = self.addr << 1
         self.temp[1] = 0x40 # Co=0, D/C#=1
         self.i2c.start()
@@ -111,9 +424,20 @@ class SSD1306_I2C(SSD1306):
         self.i2c.write(buf)
         self.i2c.stop()
 
+    def _write_region(self, start, end, frame):
+        # The byte before the region is replaced by the data control
+        # byte for a single hardware write straight from the frame
+        saved = frame[start]
+        frame[start] = 0x40 # Co=0, D/C#=1
+        try:
+            self.i2c.writeto(self.addr, memoryview(frame)[start:end + 1])
+        finally:
+            frame[start] = saved
+
 
 class SSD1306_SPI(SSD1306):
-    def __init__(self, width, height, spi, dc, res, cs, external_vcc=False):
+    def __init__(self, width, height, spi, dc, res, cs, external_vcc=False,
+                 double_buffer=False):
         self.rate = 10 * 1024 * 1024
         dc.init(dc.OUT, value=0)
         res.init(res.OUT, value=0)
@@ -122,20 +446,43 @@ class SSD1306_SPI(SSD1306):
         self.dc = dc
         self.res = res
         self.cs = cs
+        self.temp = bytearray(1)
+        self.cmds = bytearray(32)
         import time
         self.res(1)
         time.sleep_ms(1)
         self.res(0)
         time.sleep_ms(10)
         self.res(1)
-        super().__init__(width, height, external_vcc)
+        super().__init__(width, height, external_vcc, double_buffer)
+
+    def _bus_key(self):
+        return self.spi, self.cs
 
     def write_cmd(self, cmd):
+        self.temp[0] = cmd
+        self.write_cmds(self.temp)
+
+    def write_cmds(self, cmds):
+        # The bus may be shared, so it is configured once per sequence
         self.spi.init(baudrate=self.rate, polarity=0, phase=0)
         self.cs(1)
         self.dc(0)
         self.cs(0)
-        self.spi.write(bytearray([cmd]))
+        if isinstance(cmds, (bytes, bytearray)):
+            self.spi.write(cmds)
+        else:
+            buf = self.cmds
+            view = memoryview(buf)
+            count = 0
+            for index in range(len(cmds)):
+                buf[count] = cmds[index]
+                count += 1
+                if count == len(buf):
+                    self.spi.write(buf)
+                    count = 0
+            if count:
+                self.spi.write(view[:count])
         self.cs(1)
 
     def write_data(self, buf):
@@ -1,22 +1,244 @@
-class Deque(list):
-    def __init__(self, *args, max_len=20, **kwargs):
+import os
+import struct
+import time
+from array import array
+try:
+    from .codec import encode_frame
+except ImportError:
+    from codec import encode_frame
+
+
+def _chain(segments):
+    # Iterates over the values of the segments of a window
+    for segment in segments:
+        for value in segment:
+            yield value
+
+
+class _Extreme(object):
+    """
+    Monotonic queue with the positions (in append order) of the
+    candidates to the minimum (or maximum) of a sliding window
+    """
+
+    def __init__(self, max_len, maximum=False):
         self._max_len = max_len
-        super(Deque, self).__init__(*args, **kwargs)
-        self._check_size()
+        self._maximum = maximum
+        self._indices = array("i", (0 for _ in range(max_len)))
+        self._head = 0
+        self._size = 0
+
+    def clear(self):
+        self._head = 0
+        self._size = 0
 
-    def append(self, *args, **kwargs):
-        super(Deque, self).append(*args, **kwargs)
-        self._check_size()
+    def push(self, index, value, data):
+        """
+        Adds the value appended at index, data is the ring storage
+        """
+        max_len = self._max_len
+        indices = self._indices
+        # The oldest candidate may have left the window
+        if self._size and indices[self._head] <= index - max_len:
+            self._head = (self._head + 1) % max_len
+            self._size -= 1
+        # Candidates that can no longer be the extreme
+        while self._size:
+            last = indices[(self._head + self._size - 1) % max_len]
+            old = data[last % max_len]
+            if self._maximum:
+                if old > value:
+                    break
+            elif old < value:
+                break
+            self._size -= 1
+        indices[(self._head + self._size) % max_len] = index
+        self._size += 1
+
+    @property
+    def front(self):
+        return self._indices[self._head]
+
+
+class Deque(object):
+    """
+    Circular buffer with a fixed capacity backed by a typed array.
+    Once it is full each new value replaces the oldest one. The sum of
+    the stored values (and optionally their minimum and maximum) is
+    updated on each append, so it is available in constant time.
+
+    Parameters
+    ----------
+    iterable : iterable (optional)
+        Initial values. Default empty
+    max_len : int (optional)
+        Maximum number of values stored. Default 20
+    typecode : str (optional)
+        Typecode of the array ('f' for floats, 'i' for integers...).
+        Default 'f'
+    extremes : bool (optional)
+        If True the minimum and maximum are tracked on each append,
+        which needs two more arrays of max_len integers. If not they
+        are searched when requested. Default False
+    """
+
+    def __init__(self, iterable=(), max_len=20, typecode="f",
+                 extremes=False):
+        if max_len < 1:
+            raise ValueError("max_len must be at least 1")
+        self._max_len = max_len
+        self._data = array(typecode, (0 for _ in range(max_len)))
+        if extremes:
+            self._minimum = _Extreme(max_len)
+            self._maximum = _Extreme(max_len, maximum=True)
+        else:
+            self._minimum = None
+            self._maximum = None
+        self.clear()
+        self.extend(iterable)
 
-    def _check_size(self):
-        while len(self) > self._max_len:
-            self.pop(0)
+    def __len__(self):
+        return self._len
 
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self)[index]
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError("Deque index out of range")
+        return self._data[(self._count - self._len + index) % self._max_len]
+
+    def __iter__(self):
+        data = self._data
+        max_len = self._max_len
+        for index in range(self._count - self._len, self._count):
+            yield data[index % max_len]
+
+    def __repr__(self):
+        return "Deque({})".format(list(self))
+
+    def append(self, value):
+        """
+        Adds the value at the end, dropping the oldest one if full
+        """
+        data = self._data
+        position = self._count % self._max_len
+        if self._len < self._max_len:
+            self._len += 1
+        else:
+            self._sum -= data[position]
+        data[position] = value
+        # Use the stored value, it may have been rounded
+        value = data[position]
+        if self._minimum is not None:
+            self._minimum.push(self._count, value, data)
+            self._maximum.push(self._count, value, data)
+        self._count += 1
+        if position == self._max_len - 1:
+            # Recompute the sum once per turn to avoid drifting
+            self._sum = sum(data)
+        else:
+            self._sum += value
+
+    def window(self, start=0, stop=None):
+        """
+        Values between start and stop (as in a slice) without copying
+        them.
+
+        Returns
+        -------
+        tuple with up to two memoryviews of the storage, that hold the
+        values in order once concatenated (the values may wrap around
+        the end of the ring)
+        """
+        length = self._len
+        if stop is None or stop > length:
+            stop = length
+        elif stop < 0:
+            stop = max(0, stop + length)
+        if start < 0:
+            start = max(0, start + length)
+        if start >= stop:
+            return ()
+
+        max_len = self._max_len
+        first = (self._count - length + start) % max_len
+        end = first + stop - start
+        view = memoryview(self._data)
+        if end <= max_len:
+            return (view[first:end],)
+        return (view[first:], view[:end - max_len])
+
+    def extend(self, iterable):
+        """
+        Appends all the values of the iterable
+        """
+        for value in iterable:
+            self.append(value)
+
+    def clear(self):
+        """
+        Removes all the values
+        """
+        self._count = 0
+        self._len = 0
+        self._sum = 0
+        if self._minimum is not None:
+            self._minimum.clear()
+            self._maximum.clear()
+
+    def _check_empty(self):
+        if not self._len:
+            raise ValueError("The Deque is empty")
+
+    @property
+    def max_len(self):
+        """
+        Maximum number of values stored
+        """
+        return self._max_len
+
+    @property
+    def minimum(self):
+        """
+        Minimum of the stored values
+        """
+        self._check_empty()
+        if self._minimum is None:
+            return min(_chain(self.window()))
+        return self._data[self._minimum.front % self._max_len]
+
+    @property
+    def maximum(self):
+        """
+        Maximum of the stored values
+        """
+        self._check_empty()
+        if self._maximum is None:
+            return max(_chain(self.window()))
+        return self._data[self._maximum.front % self._max_len]
+
+    @property
+    def sum(self):
+        """
+        Sum of the stored values
+        """
+        return self._sum
+
+    @property
+    def mean(self):
+        """
+        Mean of the stored values
+        """
+        self._check_empty()
+        return self._sum / self._len
 
 
 class MultipleHistorial(object):
     """Creates an object to store information about different Historic
-    data saved with different frequencies.
+    data saved with different frequencies. Each record is stored with
+    its timestamp, so the records can be looked up by time.
 
     Parameters:
     -----------
@@ -26,22 +248,68 @@ class MultipleHistorial(object):
         once every 2 measures.
     dimension : int (optional)
         Dimension of the data to be stored. Default 2
+    aggregate : bool (optional)
+        If True, instead of keeping one of every N measures, each
+        historial stores the mean, minimum and maximum of the measures
+        of its period, built from the next faster historial (so each
+        multiplier must divide the next one). Default False
     *kwargs : keyword arguments for the Deque class
     """
 
-    def __init__(self, period_multipliers, dimension=2, **kwargs):
+    def __init__(self, period_multipliers, dimension=2, aggregate=False,
+                 **kwargs):
         super(MultipleHistorial, self).__init__()
         self._historials = {}
+        self._minima = {}
+        self._maxima = {}
+        self._timestamps = {}
+        self._last_timestamp = None
         self._counters = {}
         self._dimension = dimension
+        self._aggregate = aggregate
         self._period_multipliers = list(sorted(period_multipliers))
         self.current = self._period_multipliers[0]
+        # The extremes of the periods are not tracked (their minimum and
+        # maximum are searched if requested)
+        extreme_kwargs = dict(kwargs)
+        extreme_kwargs["extremes"] = False
 
-        
         for multiplier in self._period_multipliers:
             self._counters[multiplier] = multiplier
-            self._historials[multiplier] = tuple(Deque()
+            self._historials[multiplier] = tuple(Deque(**kwargs)
+                                                 for _ in range(dimension))
+            max_len = self._historials[multiplier][0].max_len
+            self._timestamps[multiplier] = Deque(max_len=max_len,
+                                                 typecode="L")
+            if aggregate and multiplier != 1:
+                self._minima[multiplier] = tuple(Deque(**extreme_kwargs)
+                                                 for _ in range(dimension))
+                self._maxima[multiplier] = tuple(Deque(**extreme_kwargs)
                                                  for _ in range(dimension))
+            else:
+                # A single measure per period, the mean is the extreme
+                self._minima[multiplier] = self._historials[multiplier]
+                self._maxima[multiplier] = self._historials[multiplier]
+
+        if aggregate:
+            self._init_cascade()
+
+    def _init_cascade(self):
+        # Each level accumulates the buckets of the previous one (the
+        # raw measures for the first level)
+        self._ratios = []
+        previous = 1
+        for multiplier in self._period_multipliers:
+            if multiplier % previous:
+                text = "Multiplier {} is not a multiple of {}"
+                raise ValueError(text.format(multiplier, previous))
+            self._ratios.append(multiplier // previous)
+            previous = multiplier
+        levels = len(self._period_multipliers)
+        self._bucket_counts = [0] * levels
+        self._bucket_sums = [[0.] * self._dimension for _ in range(levels)]
+        self._bucket_minima = [[0.] * self._dimension for _ in range(levels)]
+        self._bucket_maxima = [[0.] * self._dimension for _ in range(levels)]
 
     def __getitem__(self, index):
         return self._historials[self.current][index]
@@ -52,7 +320,7 @@ class MultipleHistorial(object):
     def __repr__(self):
         return self._historials.__repr__()
 
-    def add(self, values):
+    def add(self, values, timestamp=None):
         """
         Adds the values to the historial records if it is time to update it.
 
@@ -60,6 +328,10 @@ class MultipleHistorial(object):
         ----------
         values : list or tuple
             Iterable with the same length than the historial records.
+        timestamp : int or None (optional)
+            Time of the measure (s). If None time.time() is used. The
+            timestamps never go backwards, an older one is replaced by
+            the previous timestamp. Default None
 
         Raises
         ------
@@ -72,14 +344,139 @@ class MultipleHistorial(object):
             text = text.format(len(values), self._dimension)
             raise ValueError(text)
 
+        if timestamp is None:
+            timestamp = int(time.time())
+        if self._last_timestamp is not None:
+            timestamp = max(timestamp, self._last_timestamp)
+        self._last_timestamp = timestamp
+
+        if self._aggregate:
+            self._accumulate(0, values, values, values, timestamp)
+            return
+
         for multipler, counter in self._counters.items():
             if counter == multipler:
                 self._counters[multipler] = 0
                 for index, value in enumerate(values):
                     self._historials[counter][index].append(value)
+                self._timestamps[counter].append(timestamp)
 
             self._counters[multipler] += 1
 
+    def _accumulate(self, level, means, minima, maxima, timestamp):
+        # Adds a bucket of the previous level (or a measure) to level.
+        # The periods are timestamped with their last measure
+        sums = self._bucket_sums[level]
+        bucket_minima = self._bucket_minima[level]
+        bucket_maxima = self._bucket_maxima[level]
+        first = not self._bucket_counts[level]
+        for index in range(self._dimension):
+            if first:
+                sums[index] = means[index]
+                bucket_minima[index] = minima[index]
+                bucket_maxima[index] = maxima[index]
+            else:
+                sums[index] += means[index]
+                if minima[index] < bucket_minima[index]:
+                    bucket_minima[index] = minima[index]
+                if maxima[index] > bucket_maxima[index]:
+                    bucket_maxima[index] = maxima[index]
+        self._bucket_counts[level] += 1
+
+        ratio = self._ratios[level]
+        if self._bucket_counts[level] < ratio:
+            return
+
+        multiplier = self._period_multipliers[level]
+        historial = self._historials[multiplier]
+        for index in range(self._dimension):
+            sums[index] /= ratio
+            historial[index].append(sums[index])
+        self._timestamps[multiplier].append(timestamp)
+        if self._minima[multiplier] is not historial:
+            for index in range(self._dimension):
+                self._minima[multiplier][index].append(bucket_minima[index])
+                self._maxima[multiplier][index].append(bucket_maxima[index])
+        if level + 1 < len(self._period_multipliers):
+            self._accumulate(level + 1, sums, bucket_minima, bucket_maxima,
+                             timestamp)
+        self._bucket_counts[level] = 0
+
+    def window(self, index, start=0, stop=None):
+        """
+        Values of the current historial between start and stop without
+        copying them, see Deque.window
+        """
+        return self._historials[self.current][index].window(start, stop)
+
+    def _bisect(self, timestamp):
+        # First position of the current historial at or after timestamp
+        timestamps = self._timestamps[self.current]
+        low = 0
+        high = len(timestamps)
+        while low < high:
+            middle = (low + high) // 2
+            if timestamps[middle] < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def range(self, start_time, stop_time):
+        """
+        Positions (start, stop) of the records of the current historial
+        with start_time <= timestamp < stop_time, found by bisection.
+        They can be passed to window.
+        """
+        return self._bisect(start_time), self._bisect(stop_time)
+
+    def latest(self, count):
+        """
+        Positions (start, stop) of the last count records of the
+        current historial. They can be passed to window.
+        """
+        length = len(self._timestamps[self.current])
+        return max(0, length - count), length
+
+    def export(self, start=0, stop=None, scales=None):
+        """
+        Packs the records of the current historial between the
+        positions start and stop (e.g. from range or latest) with their
+        timestamps in a compact binary frame, see codec.decode_frame.
+
+        Parameters
+        ----------
+        start, stop : int (optional)
+            Positions as in a slice. Default all the records
+        scales : list(int) or None (optional)
+            Scale of each dimension in the frame. If None 100 (two
+            decimals) is used for all of them. Default None
+
+        Returns
+        -------
+        bytes with the frame
+        """
+        if scales is None:
+            scales = [100] * self._dimension
+        timestamps = self._timestamps[self.current].window(start, stop)
+        columns = [_chain(column.window(start, stop))
+                   for column in self._historials[self.current]]
+        return encode_frame(_chain(timestamps), columns, scales)
+
+    def minima(self, index):
+        """
+        Minimum of each stored period for the current historial (the
+        same values than the get index method unless aggregating)
+        """
+        return self._minima[self.current][index]
+
+    def maxima(self, index):
+        """
+        Maximum of each stored period for the current historial (the
+        same values than the get index method unless aggregating)
+        """
+        return self._maxima[self.current][index]
+
     def cycle(self):
         """
         Changes the current historial to the next one
@@ -96,6 +493,20 @@ class MultipleHistorial(object):
     def current(self, value):
         self._current = self._period_multipliers.index(value)
 
+    @property
+    def timestamps(self):
+        """
+        Timestamps of the records of the current historial
+        """
+        return self._timestamps[self.current]
+
+    @property
+    def aggregate(self):
+        """
+        Whether the historials store aggregated periods
+        """
+        return self._aggregate
+
     @property
     def dimension(self):
         """
@@ -117,4 +528,226 @@ class MultipleHistorial(object):
         Reruns the period of the slowest mode
         """
         return max(self._period_multipliers)
-    
+
+
+class FlashLog(object):
+    """
+    Append-only log of fixed size records in the flash. The records
+    are buffered and written in blocks, and the log is split in
+    segment files, named by the index of their first record (path.0,
+    path.1024...), of which only the newest ones are kept. A record cut
+    by a reset is ignored and the log continues in a new segment.
+
+    Parameters
+    ----------
+    path : str
+        Prefix of the segment files
+    record_format : str
+        struct format of the records
+    block_records : int (optional)
+        Records buffered before writing them. Default 16
+    segment_records : int (optional)
+        Records per segment. Default 1024
+    segments : int (optional)
+        Number of segments kept. Default 4
+    """
+
+    def __init__(self, path, record_format, block_records=16,
+                 segment_records=1024, segments=4):
+        self._path = path
+        self._format = record_format
+        self._record_size = struct.calcsize(record_format)
+        self._block_records = block_records
+        self._segment_records = segment_records
+        self._segments = segments
+        self._buffer = bytearray(block_records * self._record_size)
+        self._pending = 0
+
+        self._numbers = self._find_segments()
+        if not self._numbers:
+            self._numbers = [0]
+            self._current_records = 0
+        else:
+            size = os.stat(self._segment_path(self._numbers[-1]))[6]
+            self._current_records = size // self._record_size
+            if size % self._record_size:
+                # Cut record, do not append after it
+                if self._current_records:
+                    self._rotate()
+                else:
+                    # Nothing else in the segment, start it again
+                    os.remove(self._segment_path(self._numbers[-1]))
+
+    def _segment_path(self, number):
+        return "{}.{}".format(self._path, number)
+
+    def _find_segments(self):
+        if "/" in self._path:
+            directory, name = self._path.rsplit("/", 1)
+            files = os.listdir(directory or "/")
+        else:
+            name = self._path
+            files = os.listdir()
+        prefix = name + "."
+        numbers = []
+        for filename in files:
+            suffix = filename[len(prefix):]
+            if filename.startswith(prefix) and suffix.isdigit():
+                numbers.append(int(suffix))
+        numbers.sort()
+        return numbers
+
+    def _rotate(self):
+        # The new segment starts after the records of the current one,
+        # that may not be full. Its file is created by the next flush.
+        self._numbers.append(self._numbers[-1] + self._current_records)
+        self._current_records = 0
+
+    def _trim(self):
+        # Removes the oldest segments, before creating a new one
+        while len(self._numbers) > self._segments:
+            try:
+                os.remove(self._segment_path(self._numbers.pop(0)))
+            except OSError:
+                pass
+
+    def _records_in(self, number):
+        if number == self._numbers[-1]:
+            return self._current_records
+        try:
+            return os.stat(self._segment_path(number))[6] // self._record_size
+        except OSError:
+            return 0
+
+    def append(self, values):
+        """
+        Adds a record, writing the block if it is full
+        """
+        struct.pack_into(self._format, self._buffer,
+                         self._pending * self._record_size, *values)
+        self._pending += 1
+        if self._pending == self._block_records:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the buffered records to the flash
+        """
+        written = 0
+        while written < self._pending:
+            if self._current_records >= self._segment_records:
+                self._rotate()
+            if not self._current_records:
+                self._trim()
+            count = min(self._pending - written,
+                        self._segment_records - self._current_records)
+            start = written * self._record_size
+            end = start + count * self._record_size
+            with open(self._segment_path(self._numbers[-1]), "ab") as fobj:
+                fobj.write(memoryview(self._buffer)[start:end])
+            self._current_records += count
+            written += count
+        self._pending = 0
+
+    @property
+    def first_index(self):
+        """
+        Index (counted from the creation of the log) of the oldest
+        record kept
+        """
+        return self._numbers[0]
+
+    def __len__(self):
+        return (sum(self._records_in(number)
+                    for number in self._numbers) + self._pending)
+
+    def tail(self, count):
+        """
+        Iterates over the last count records (oldest first), reading
+        them one by one from the flash
+        """
+        self.flush()
+        skip = max(0, len(self) - count)
+        record = bytearray(self._record_size)
+        for number in self._numbers:
+            records = self._records_in(number)
+            if skip >= records:
+                skip -= records
+                continue
+            with open(self._segment_path(number), "rb") as fobj:
+                fobj.seek(skip * self._record_size)
+                for _ in range(records - skip):
+                    if fobj.readinto(record) != self._record_size:
+                        break
+                    yield struct.unpack(self._format, record)
+            skip = 0
+
+
+class PersistentHistorial(MultipleHistorial):
+    """
+    MultipleHistorial that also appends every measure to a FlashLog
+    and, when created, rebuilds the historials from the end of the log
+    (only the measures that fit in the slowest historial are read).
+
+    The last measures are kept in RAM until a block is complete, flush
+    must be called before a deep sleep or a reset.
+
+    Parameters
+    ----------
+    path : str
+        Prefix of the log files
+    period_multipliers : list(int)
+        See MultipleHistorial
+    dimension : int (optional)
+        Dimension of the data to be stored. Default 2
+    block_records, segment_records, segments : int (optional)
+        See FlashLog
+    **kwargs : keyword arguments for MultipleHistorial
+    """
+
+    def __init__(self, path, period_multipliers, dimension=2,
+                 block_records=16, segment_records=1024, segments=4,
+                 **kwargs):
+        super(PersistentHistorial, self).__init__(period_multipliers,
+                                                  dimension, **kwargs)
+        self._log = FlashLog(path, "<L{}f".format(dimension),
+                             block_records=block_records,
+                             segment_records=segment_records,
+                             segments=segments)
+        self._restore()
+
+    def _restore(self):
+        needed = self._historials[self.fastest][0].max_len * self.slowest
+        first = self._log.first_index
+        end = first + len(self._log)
+        # Start in a measure that keeps the period of the slowest one,
+        # before the needed ones so the oldest period is complete
+        start = max(first, end - needed)
+        start -= start % self.slowest
+        if start < first:
+            # The rest of that period is no longer in the log
+            start += self.slowest
+        count = end - start
+        for record in self._log.tail(count):
+            super(PersistentHistorial, self).add(record[1:], record[0])
+
+    def add(self, values, timestamp=None):
+        """
+        Adds the values to the historial records and to the log, see
+        MultipleHistorial.add
+        """
+        super(PersistentHistorial, self).add(values, timestamp)
+        self._log.append((self._last_timestamp,) + tuple(values))
+
+    def flush(self):
+        """
+        Writes the buffered measures to the flash
+        """
+        self._log.flush()
+
+    @property
+    def log(self):
+        """
+        The FlashLog with the measures
+        """
+        return self._log
@@ -1,31 +1,79 @@
 from . import BME280
-import utime
-from udevices.button import Button
-from machine import Pin
+import time
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
 from . import MultipleHistorial
 
 class WeatherStation(object):
     """
     Simple weather station with screen
+
+    Parameters
+    ----------
+    sda, scl : int
+        Pins of the I2C bus of the sensor
+    update_time : int (optional)
+        Seconds between measures. Default 60
+    pin_mode : int (optional)
+        Pin of the button that changes the screen (None for no button).
+        Default 15
+    oled : SSD1306 (optional)
+        The screen. Default the integrated one (udevices.OLED)
+    bme280 : BME280 (optional)
+        The sensor. Default a BME280 in the sda and scl pins
     """
 
-    def __init__(self, sda, scl, update_time=60, pin_mode=15):
-        from . import OLED
-        self.oled = OLED()
+    def __init__(self, sda, scl, update_time=60, pin_mode=15, oled=None,
+                 bme280=None):
+        # machine and framebuf are only imported here, so the module can
+        # be loaded where they are missing
+        from .chart import StripChart
+        if oled is None:
+            from . import OLED
+            oled = OLED()
+        self.oled = oled
+        # Static parts of the screens, rendered once
+        self.oled.add_layer("text", self._create_text)
+        self.oled.add_layer("axis", self._create_axis)
+        self._chart = StripChart(self.oled, 44, 0, 83, 53, step=4)
+        # Timestamp of the last record in the chart and the time
+        # between ticks shown in the x axis
+        self._plotted = None
+        self._time_label = None
         self.update_time = update_time
 
         self._screen_mode = 0
-        self._change_button = Button(pin_mode, Pin.IN, Pin.PULL_UP)
-        self._change_button.irq(self._change_mode, Pin.IRQ_FALLING)
+        if pin_mode is not None:
+            from machine import Pin
+            from .button import Button
+            self._change_button = Button(pin_mode, Pin.IN, Pin.PULL_UP)
+            self._change_button.irq(self._change_mode, Pin.IRQ_FALLING)
 
-        self.bme280 = BME280(sda=sda, scl=scl)
-        self._historial = MultipleHistorial([1, 9, 90,])
+        if bme280 is None:
+            bme280 = BME280(sda=sda, scl=scl)
+        self.bme280 = bme280
+        self._historial = MultipleHistorial([1, 9, 90,], aggregate=True)
 
         self.manual_update()
 
     def _change_mode(self, _):
-        self._screen_mode = not self._screen_mode
-        self._refresh_screen()
+        # The text screen, then the plot of each historial
+        historial = self._historial
+        if not self._screen_mode:
+            self._screen_mode = 1
+            historial.current = historial.fastest
+        elif historial.current == historial.slowest:
+            self._screen_mode = 0
+        else:
+            historial.cycle()
+
+        if self._screen_mode:
+            self._load_chart()
+            self._represent_values()
+        else:
+            self._setup_text()
 
     def _read_values(self):
         # Read new values
@@ -37,19 +85,21 @@ class WeatherStation(object):
         if not self._screen_mode:
             self._setup_text()
         else:
-            self._represent_values()
+            self._update_plot()
 
     def _setup_text(self):
         self._historial.current = self._historial.fastest
-        self.oled.fill(0)
-        self.oled.text("Temp:      C", 16, 16)
-        self.oled.text("Press:       hPa", 0, 40)
+        self.oled.compose("text")
         # Print new values
         values = (self._historial[0][-1],
                   self._historial[1][-1])
         self._print_values(values, 1)
         self.oled.show()
 
+    def _create_text(self, fbuf):
+        fbuf.text("Temp:      C", 16, 16)
+        fbuf.text("Press:       hPa", 0, 40)
+
     def manual_update(self):
         """
         Updates the values of temperature and pressure of the screen
@@ -63,33 +113,74 @@ class WeatherStation(object):
         self.oled.text("{:6.1f}".format(values[1]), 56, 40, color)
 
     def _represent_values(self):
-        self._historial.cycle()
-        self._create_axis()
+        self.oled.compose("axis")
+        self._chart.redraw()
         self._create_labels()
-        self._plot_data()
+        self.oled.show()
+
+    def _load_chart(self):
+        historial = self._historial
+        self._chart.load(historial[0], historial.minima(0),
+                         historial.maxima(0))
+        timestamps = historial.timestamps
+        self._plotted = timestamps[-1] if len(timestamps) else None
+
+    def _update_plot(self):
+        # Only the new records of the shown historial scroll the chart
+        historial = self._historial
+        timestamps = historial.timestamps
+        if not len(timestamps) or timestamps[-1] == self._plotted:
+            return
+        self._plotted = timestamps[-1]
+        if self._chart.push(historial[0][-1], historial.minima(0)[-1],
+                            historial.maxima(0)[-1]):
+            # New scale (the chart is already redrawn), the labels of
+            # the y axis must be updated too
+            self.oled.fill_rect(0, 0, 41, self.oled.height, 0)
+            self._create_range_labels()
+        if self._create_timestamp() != self._time_label:
+            # The label of the x axis is over its line
+            self.oled.fill_rect(42, 56, self.oled.width - 42, 8, 0)
+            self.oled.hline(42, 56, self.oled.width - 42, 1)
+            self._create_time_label()
         self.oled.show()
 
 
-    def _create_axis(self):
-        self.oled.fill(0)
+    def _create_axis(self, fbuf):
         # create the axis
-        self.oled.line(41, 0,
-                       41, 56, 1)
-        self.oled.line(41, 56,
-                       128, 56, 1)
+        fbuf.line(41, 0,
+                  41, 56, 1)
+        fbuf.line(41, 56,
+                  128, 56, 1)
 
         # Create some ticks
         for i in range(4):
-            self.oled.line(41, 14*i,
-                           43, 14*i, 1)
+            fbuf.line(41, 14*i,
+                      43, 14*i, 1)
 
         for i in range(6):
-            self.oled.line(46 + 16*i, 55,
-                           46 + 16*i, 53, 1)
+            fbuf.line(46 + 16*i, 55,
+                      46 + 16*i, 53, 1)
 
     def _create_labels(self, color=1):
-        maximum = max(self._historial[0])
-        minimum = min(self._historial[0])
+        if self._chart.range is None:
+            # The aggregated historials stay empty until their first
+            # period is complete
+            self.oled.text("No data", 57, 24, color)
+            self._time_label = None
+            return
+        self._create_range_labels(color)
+        self._create_time_label(color)
+
+    def _create_time_label(self, color=1):
+        # Scale of the x axis
+        self._time_label = self._create_timestamp()
+        self.oled.text("{:^11s}".format(self._time_label), 42, 56, color)
+
+    def _create_range_labels(self, color=1):
+        # The range of the chart, which may keep a value that is no
+        # longer in the historial
+        minimum, maximum = self._chart.range
         mean = (maximum + minimum) / 2
 
         self.oled.text("{:5.2f}".format(maximum),
@@ -98,12 +189,15 @@ class WeatherStation(object):
                        0, 28, color)
         self.oled.text("{:5.2f}".format(minimum),
                        0, 56, color)
-        # Scale of the y axis
-        self.oled.text("{:^11s}".format(self._create_timestamp()),
-                       42, 56)
 
     def _create_timestamp(self):
-        deltat = 4*self.update_time*self._historial.current
+        # Time between ticks (4 records) from the stored timestamps
+        timestamps = self._historial.timestamps
+        if len(timestamps) > 1:
+            span = timestamps[-1] - timestamps[0]
+            deltat = int(4 * span / (len(timestamps) - 1))
+        else:
+            deltat = 4*self.update_time*self._historial.current
 
         timestamp = ""
 
@@ -120,30 +214,6 @@ class WeatherStation(object):
         return timestamp[:-1]
         
 
-    def _plot_data(self, color=1):
-        maximum = max(self._historial[0])
-        minimum = min(self._historial[0])
-
-        last = None
-
-        for i, temp in enumerate(self._historial[0]):
-            diff = maximum - minimum
-            if diff == 0:
-                diff = 0.1
-            yfraction = (temp - minimum) / diff
-            ycoord = int(56 * (1 - yfraction))
-            xcoord = 46 + 4*i
-
-            if last is None:
-                last = (xcoord, ycoord)
-
-            self.oled.line(xcoord, ycoord,
-                           last[0], last[1],
-                           color)
-            last = (xcoord, ycoord)
-        return
-
-
     def run_service(self):
         """
         Autoupdates with new values forever
@@ -151,4 +221,22 @@ class WeatherStation(object):
         print("starting")
         while True:
             self.manual_update()
-            utime.sleep(self.update_time)
+            time.sleep(self.update_time)
+
+    async def manual_update_async(self):
+        """
+        Awaitable version of manual_update
+        """
+        await self.bme280.update_async()
+        self._historial.add((self.bme280.temperature, self.bme280.pressure))
+        self._refresh_screen()
+
+    async def run_async(self):
+        """
+        Autoupdates with new values forever, without blocking the event
+        loop between samples
+        """
+        print("starting")
+        while True:
+            await self.manual_update_async()
+            await asyncio.sleep(self.update_time)